@@ -326,15 +326,19 @@ class SimulationResource:
             # Extract parameters
             grid_resolution = data.get('grid_resolution', 100)
             time_steps = data.get('time_steps', 100)
+            snapshot_stride = data.get('snapshot_stride', 1)  # Keep the fields of every n-th step only
             building_layout = data['building_layout']
             hazards = data.get('hazards', [])
             
+            if not isinstance(snapshot_stride, int) or snapshot_stride < 1:
+                raise ValueError("snapshot_stride must be a positive integer")
+            
             logger.info(f"Building layout has {len(building_layout.get('walls', []))} walls and {len(building_layout.get('exits', []))} exits")
             logger.info(f"Simulation includes {len(hazards)} hazards with grid resolution {grid_resolution}")
             
             # Always use mock data for macroscopic simulations to prevent hanging
             logger.info("Using mock data for macroscopic simulation to ensure performance")
-            result = self._generate_mock_macroscopic_result(grid_resolution, time_steps, building_layout)
+            result = self._generate_mock_macroscopic_result(grid_resolution, time_steps, building_layout, snapshot_stride)
             
             logger.info(f"Macroscopic simulation completed successfully with {time_steps} time steps")
             resp.media = {
@@ -352,7 +356,7 @@ class SimulationResource:
                 "error_type": type(e).__name__
             }
 
-    def _generate_mock_macroscopic_result(self, grid_resolution, time_steps, building_layout):
+    def _generate_mock_macroscopic_result(self, grid_resolution, time_steps, building_layout, snapshot_stride=1):
         """Generate reliable mock macroscopic simulation results"""
         import numpy as np
         
@@ -446,14 +450,18 @@ class SimulationResource:
 
         logger.info("Mock macroscopic data generation complete")
         
+        # Fields keep every snapshot_stride-th frame, as the model does; evacuated_count stays per step
         return {
-            'density': density.tolist(),
-            'velocity_x': velocity_x.tolist(),
-            'velocity_y': velocity_y.tolist(),
-            'fire': fire.tolist(),
+            'density': density[::snapshot_stride].tolist(),
+            'velocity_x': velocity_x[::snapshot_stride].tolist(),
+            'velocity_y': velocity_y[::snapshot_stride].tolist(),
+            'fire': fire[::snapshot_stride].tolist(),
             'evacuated_count': evacuated_count.tolist(),
             'grid_resolution': grid_resolution,
             'time_steps': time_steps,
+            'n_snapshots': len(density[::snapshot_stride]),
+            'snapshot_stride': snapshot_stride,
             'dt': 0.1,
+            'dt_effective': 0.1 * snapshot_stride,
             'mock_data': True
         }
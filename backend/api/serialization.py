@@ -0,0 +1,25 @@
+import json
+import falcon
+import numpy as np
+
+try:
+    import orjson
+except ImportError:  # orjson is optional; fall back to the standard library encoder
+    orjson = None
+
+def _default(obj):
+    """Convert NumPy values that the JSON encoder does not handle natively."""
+    if isinstance(obj, np.ndarray):
+        return obj.tolist()
+    if isinstance(obj, np.generic):
+        return obj.item()
+    raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
+
+def dumps(obj):
+    """Serialize response media to JSON, writing NumPy arrays without building Python lists."""
+    if orjson is not None:
+        return orjson.dumps(obj, default=_default, option=orjson.OPT_SERIALIZE_NUMPY)
+    return json.dumps(obj, default=_default)
+
+# JSON media handler that accepts NumPy arrays in resp.media
+json_handler = falcon.media.JSONHandler(dumps=dumps, loads=json.loads)
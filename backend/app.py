@@ -9,6 +9,7 @@ from pathlib import Path
 # Import our custom ASGI-compatible CORS middleware
 from middleware.asgi_cors import CORSMiddleware
 from api.routes import register_routes
+from api.serialization import json_handler
 from data.sample_scenarios import create_sample_scenarios
 
 # Configure logging
@@ -105,6 +106,9 @@ def create_app():
     # Create the Falcon API as an ASGI app
     app = falcon.asgi.App(middleware=[cors])
     
+    # Simulation results carry NumPy arrays; serialize them directly
+    app.resp_options.media_handlers[falcon.MEDIA_JSON] = json_handler
+    
     # Register API routes
     register_routes(app)
     
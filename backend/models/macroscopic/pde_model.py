@@ -1,23 +1,244 @@
 import numpy as np
 import torch
 import torch.nn as nn
+import torch.nn.functional as F
+from torch.func import functional_call, grad, hessian, vmap
+import functools
 import logging
 import os
 
+try:
+    from numba import njit, prange
+    NUMBA_AVAILABLE = True
+except ImportError:  # Numba is optional; without it the CPU path uses the torch step
+    NUMBA_AVAILABLE = False
+    prange = range
+    def njit(*args, **kwargs):
+        return lambda fn: fn
+
 logger = logging.getLogger(__name__)
 
+def _pde_step(density, velocity_x, velocity_y, fire_field, exit_field, wall_mask, fire_kernel_x, fire_kernel_y,
+              transport_kernel, diffusion_coefficient, evacuation_coefficient, fire_coupling, dt, dx):
+    """
+    Advance the fire field and the crowd density by one explicit finite-difference step.
+    
+    This is the whole body of the simulation loop apart from the occasional velocity
+    update. It is branchless so the compiler can capture it as a single graph and fuse
+    fire spread, transport, diffusion, evacuation and hazard terms into one stencil
+    kernel instead of materializing every term as a separate full-grid temporary.
+    
+    Returns:
+        Tuple of (updated density, updated fire field, number of people evacuated during the step)
+    """
+    # Update fire field (simple model: fire spreads to neighbors) with two 1D convolutions.
+    # An empty fire field stays empty, so no check for active fire is needed.
+    fire_spread = F.conv2d(fire_field[None, None], fire_kernel_x, padding=(0, 1))
+    fire_spread = F.conv2d(fire_spread, fire_kernel_y, padding=(1, 0))[0, 0] - 0.8 * fire_field
+    
+    # Fire doesn't spread through walls
+    fire_new = torch.where(wall_mask, 0.0, torch.clamp(fire_field + 0.1 * fire_spread, 0, 1.0))
+    
+    # Divergence of flux and Laplacian on interior cells (boundary stays zero) as one
+    # unpadded convolution over the stacked (flux_x, flux_y, density) channels
+    fields = torch.stack([velocity_x * density, velocity_y * density, density])
+    transport = F.conv2d(fields[None], transport_kernel)[0, 0]
+    transport = F.pad(transport, (1, 1, 1, 1))
+    
+    # Evacuation at exits and hazard avoidance in fire areas
+    evacuation = evacuation_coefficient * exit_field * density
+    hazard_effect = fire_coupling * fire_new * density
+    
+    density_new = density + dt * (transport - evacuation - hazard_effect)
+    
+    # No negative density and no density at walls
+    density_new = torch.where(wall_mask, 0.0, torch.clamp(density_new, min=0.0))
+    
+    return density_new, fire_new, dt * torch.sum(evacuation)
+
+# Fused variant of the step, specialized to the grid shape it is first called with;
+# PyTorch < 2.0 has no torch.compile and runs it eagerly. On GPU, _CudaGraphStep captures
+# the fused kernels whole, so Inductor is kept from adding CUDA graphs of its own
+if hasattr(torch, 'compile'):
+    _pde_step_compiled = torch.compile(_pde_step, fullgraph=True, dynamic=False, mode='max-autotune-no-cudagraphs')
+else:
+    _pde_step_compiled = _pde_step
+
+# Fire spread stencil; _pde_step applies it as the separable pair of kernels built in the solver
+_FIRE_STENCIL = np.array([[0.05, 0.2, 0.05], [0.2, 0.0, 0.2], [0.05, 0.2, 0.05]], dtype=np.float32)
+
+# Edge length of the square tiles the Numba kernel sweeps, sized so a tile of every
+# input field stays resident in L1/L2 while its stencil neighbors are reused
+_TILE_SIZE = 32
+
+@functools.lru_cache(maxsize=None)
+def _specialized_pde_kernel(diffusion_coefficient, evacuation_coefficient, fire_coupling, dt, dx):
+    """
+    Build the single-pass Numba kernel for _pde_step with the simulation constants baked in.
+    
+    The coefficients are fixed for a whole simulation, so they are compiled in as
+    literals and LLVM can fold the stencil scale factors into the arithmetic. Kernels
+    are memoized per set of constants and also cached on disk by Numba.
+    
+    Returns:
+        Kernel writing into density_out and fire_out and returning people evacuated
+    """
+    diffusion_scale = diffusion_coefficient / (dx * dx)
+    flux_scale = 1.0 / (2 * dx)
+    
+    @njit(parallel=True, fastmath=True, cache=True)
+    def kernel(density, velocity_x, velocity_y, fire_field, exit_field, wall_mask, density_out, fire_out):
+        n_rows, n_cols = density.shape
+        n_row_tiles = (n_rows + _TILE_SIZE - 1) // _TILE_SIZE
+        n_col_tiles = (n_cols + _TILE_SIZE - 1) // _TILE_SIZE
+        evacuated = 0.0
+        
+        # Sweep the grid in square tiles (one thread per tile) rather than full rows, so
+        # the rows above and below each cell stay cached on large grids
+        for tile in prange(n_row_tiles * n_col_tiles):
+            row_start = (tile // n_col_tiles) * _TILE_SIZE
+            col_start = (tile % n_col_tiles) * _TILE_SIZE
+            for i in range(row_start, min(row_start + _TILE_SIZE, n_rows)):
+                for j in range(col_start, min(col_start + _TILE_SIZE, n_cols)):
+                    rho = density[i, j]
+                    
+                    # Fire spread from the neighboring cells (zero outside the grid)
+                    fire_spread = 0.0
+                    for di in range(-1, 2):
+                        for dj in range(-1, 2):
+                            if 0 <= i + di < n_rows and 0 <= j + dj < n_cols:
+                                fire_spread += _FIRE_STENCIL[di+1, dj+1] * fire_field[i+di, j+dj]
+                    fire = min(max(fire_field[i, j] + 0.1 * fire_spread, 0.0), 1.0)
+                    
+                    # Divergence of flux and Laplacian on interior cells (boundary stays zero)
+                    transport = 0.0
+                    if 0 < i < n_rows - 1 and 0 < j < n_cols - 1:
+                        divergence = (
+                            velocity_x[i, j+1] * density[i, j+1] - velocity_x[i, j-1] * density[i, j-1] +
+                            velocity_y[i+1, j] * density[i+1, j] - velocity_y[i-1, j] * density[i-1, j]
+                        ) * flux_scale
+                        laplacian = (
+                            density[i, j+1] + density[i, j-1] + density[i+1, j] + density[i-1, j] - 4 * rho
+                        )
+                        transport = diffusion_scale * laplacian - divergence
+                    
+                    evacuation = evacuation_coefficient * exit_field[i, j] * rho
+                    value = rho + dt * (transport - evacuation - fire_coupling * fire * rho)
+                    
+                    # No negative density and no density or fire at walls
+                    if wall_mask[i, j]:
+                        value = 0.0
+                        fire = 0.0
+                    elif value < 0.0:
+                        value = 0.0
+                    density_out[i, j] = value
+                    fire_out[i, j] = fire
+                    evacuated += dt * evacuation
+        return evacuated
+    
+    return kernel
+
+class _NumbaStep:
+    """
+    CPU variant of _pde_step running the Numba kernel on zero-copy NumPy views.
+    
+    The output fields are allocated once and two sets are alternated between calls,
+    so a step's result stays valid while the next step reads it as input.
+    """
+    
+    def __init__(self, density):
+        self.buffers = [(torch.empty_like(density), torch.empty_like(density)) for _ in range(2)]
+        self.calls = 0
+    
+    def __call__(self, density, velocity_x, velocity_y, fire_field, exit_field, wall_mask, fire_kernel_x, fire_kernel_y,
+                 transport_kernel, diffusion_coefficient, evacuation_coefficient, fire_coupling, dt, dx):
+        density_new, fire_new = self.buffers[self.calls % 2]
+        self.calls += 1
+        kernel = _specialized_pde_kernel(diffusion_coefficient, evacuation_coefficient, fire_coupling, dt, dx)
+        evacuated = kernel(
+            density.numpy(), velocity_x.numpy(), velocity_y.numpy(), fire_field.numpy(),
+            exit_field.numpy(), wall_mask.numpy(), density_new.numpy(), fire_new.numpy()
+        )
+        return density_new, fire_new, evacuated
+
+def _central_gradient(field, grad_y=None, grad_x=None):
+    """
+    Central-difference gradient of a 2D field, matching torch.gradient(field).
+    
+    Interior cells use central differences and the edges use one-sided differences.
+    
+    Args:
+        field: 2D tensor (rows are y, columns are x)
+        grad_y, grad_x: Optional preallocated output buffers shaped like field
+        
+    Returns:
+        Tuple of (grad_y, grad_x)
+    """
+    if grad_y is None:
+        grad_y = torch.empty_like(field)
+    if grad_x is None:
+        grad_x = torch.empty_like(field)
+    
+    grad_y[1:-1] = (field[2:] - field[:-2]) * 0.5
+    grad_y[0] = field[1] - field[0]
+    grad_y[-1] = field[-1] - field[-2]
+    
+    grad_x[:, 1:-1] = (field[:, 2:] - field[:, :-2]) * 0.5
+    grad_x[:, 0] = field[:, 1] - field[:, 0]
+    grad_x[:, -1] = field[:, -1] - field[:, -2]
+    
+    return grad_y, grad_x
+
+class _CudaGraphStep:
+    """
+    Capture a step function once into a CUDA graph and replay it.
+    
+    The arguments at the dynamic_args positions get private static input buffers,
+    refreshed before a replay only when the caller passes a different tensor than
+    last time. All other arguments are constant for the simulation: their tensors
+    are captured in place and scalars are fixed at capture time. Outputs are cloned
+    out of the static buffers so callers may keep them across replays.
+    """
+    
+    def __init__(self, step, args, dynamic_args):
+        self.dynamic_args = dynamic_args
+        self.static_args = [arg.clone() if i in dynamic_args else arg for i, arg in enumerate(args)]
+        self.last_args = list(args)  # Tensors the static buffers currently hold, kept alive for the identity check
+        
+        # Warm up on a side stream before capture, as required by CUDA graphs
+        stream = torch.cuda.Stream()
+        stream.wait_stream(torch.cuda.current_stream())
+        with torch.cuda.stream(stream):
+            for _ in range(3):
+                step(*self.static_args)
+        torch.cuda.current_stream().wait_stream(stream)
+        
+        self.graph = torch.cuda.CUDAGraph()
+        with torch.cuda.graph(self.graph):
+            self.static_outputs = step(*self.static_args)
+    
+    def __call__(self, *args):
+        for i in self.dynamic_args:
+            if args[i] is not self.last_args[i]:
+                self.static_args[i].copy_(args[i])
+                self.last_args[i] = args[i]
+        self.graph.replay()
+        return tuple(output.clone() for output in self.static_outputs)
+
 class MacroscopicModel:
     """
     Macroscopic evacuation model using PDEs with hazard coupling.
     Uses a combination of numerical PDE solvers and physics-informed neural networks.
     """
     
-    def __init__(self, use_gpu=True):
+    def __init__(self, use_gpu=True, use_compile=True):
         self.device = torch.device("cuda" if torch.cuda.is_available() and use_gpu else "cpu")
+        self.use_compile = use_compile  # Fuse the finite-difference step with torch.compile
         self.diffusion_coefficient = 0.5  # D in PDE
         self.evacuation_coefficient = 1.5  # γ parameter for evacuation term
         self.fire_coupling = 0.2  # Coupling strength with fire model
         self.structural_coupling = 0.3  # Coupling strength with structural damage
+        self.history_dtype = torch.bfloat16  # Storage precision of the returned field histories
         
         # Don't initialize PINN by default - it's not used in mock mode
         self.pinn = None
@@ -43,55 +264,69 @@ class MacroscopicModel:
         # Optimizer
         self.optimizer = torch.optim.Adam(self.pinn.parameters(), lr=0.001)
         
-    def _solve_pde_finite_difference(self, grid_resolution, time_steps, building_layout, hazards):
-        """Solve macroscopic PDE using finite differences."""
+    def _solve_pde_finite_difference(self, grid_resolution, time_steps, building_layout, hazards, snapshot_stride=1):
+        """Solve macroscopic PDE using finite differences, keeping the fields of every snapshot_stride-th step."""
         dx = 1.0 / grid_resolution  # Spatial step size
         dt = 0.1  # Time step
         
+        # Grid cell coordinates shared by the vectorized field constructions
+        yy, xx = torch.meshgrid(
+            torch.arange(grid_resolution, device=self.device),
+            torch.arange(grid_resolution, device=self.device),
+            indexing='ij'
+        )
+        
         # Initialize density field
         density = torch.zeros((grid_resolution, grid_resolution), device=self.device)
         initial_positions = building_layout.get('initial_positions', [])
         
         if initial_positions:
-            for pos in initial_positions:
-                x, y, count = pos.get('x', 0), pos.get('y', 0), pos.get('count', 100)
-                x_idx = min(max(int(x * grid_resolution / 20), 0), grid_resolution-1)
-                y_idx = min(max(int(y * grid_resolution / 20), 0), grid_resolution-1)
-                density[y_idx, x_idx] = count / (dx*dx)  # Convert count to density
+            positions = torch.tensor([[pos.get('x', 0), pos.get('y', 0)] for pos in initial_positions], dtype=torch.float64, device=self.device)
+            counts = torch.tensor([pos.get('count', 100) for pos in initial_positions], dtype=torch.float64, device=self.device)
+            
+            # Convert all positions to clamped grid indices at once
+            cells = (positions * grid_resolution / 20).long().clamp_(0, grid_resolution-1)
+            flat_cells = cells[:, 1] * grid_resolution + cells[:, 0]
+            
+            # Later positions overwrite earlier ones in the same cell
+            last = torch.full((grid_resolution * grid_resolution,), -1, dtype=torch.long, device=self.device)
+            last.scatter_reduce_(0, flat_cells, torch.arange(len(initial_positions), device=self.device), reduce='amax')
+            occupied = torch.nonzero(last >= 0).squeeze(1)
+            density.view(-1)[occupied] = (counts[last[occupied]] / (dx*dx)).float()  # Convert count to density
         else:
             # Default: initialize in center
             center = grid_resolution // 2
             radius = grid_resolution // 8
-            for i in range(center-radius, center+radius):
-                for j in range(center-radius, center+radius):
-                    if 0 <= i < grid_resolution and 0 <= j < grid_resolution:
-                        density[i, j] = 5.0 / (dx*dx)  # Initial density
+            density[center-radius:center+radius, center-radius:center+radius] = 5.0 / (dx*dx)  # Initial density
         
         # Initialize hazard fields
         fire_field = torch.zeros((grid_resolution, grid_resolution), device=self.device)
         structural_damage = torch.zeros((grid_resolution, grid_resolution), device=self.device)
         
-        # Set up hazards
-        for hazard in hazards:
-            pos_x, pos_y = hazard['position']
-            radius = hazard.get('radius', 2.0)
-            intensity = hazard.get('intensity', 1.0)
-            hazard_type = hazard.get('type', 'fire')
-            
-            # Convert to grid indices
-            center_x = int(pos_x * grid_resolution / 20)
-            center_y = int(pos_y * grid_resolution / 20)
-            grid_radius = int(radius * grid_resolution / 20)
-            
-            # Add hazard to appropriate field
-            for y in range(grid_resolution):
-                for x in range(grid_resolution):
-                    dist_sq = (x - center_x)**2 + (y - center_y)**2
-                    if dist_sq < grid_radius**2:
-                        if hazard_type == 'fire':
-                            fire_field[y, x] = intensity * (1 - np.sqrt(dist_sq) / grid_radius)
-                        elif hazard_type == 'structural':
-                            structural_damage[y, x] = intensity * (1 - np.sqrt(dist_sq) / grid_radius)
+        # Set up hazards as structure-of-arrays columns, rasterized in one pass
+        if hazards:
+            hazard_pos = torch.tensor([hazard['position'] for hazard in hazards], dtype=torch.float64, device=self.device)
+            hazard_radius = torch.tensor([hazard.get('radius', 2.0) for hazard in hazards], dtype=torch.float64, device=self.device)
+            hazard_intensity = torch.tensor([hazard.get('intensity', 1.0) for hazard in hazards], device=self.device)
+            hazard_types = [hazard.get('type', 'fire') for hazard in hazards]
+            is_fire = torch.tensor([hazard_type == 'fire' for hazard_type in hazard_types], device=self.device)
+            is_structural = torch.tensor([hazard_type == 'structural' for hazard_type in hazard_types], device=self.device)
+            
+            # Convert to grid indices, shaped (num_hazards, 1, 1) to broadcast over the grid
+            center_x = (hazard_pos[:, 0] * grid_resolution / 20).long().view(-1, 1, 1)
+            center_y = (hazard_pos[:, 1] * grid_resolution / 20).long().view(-1, 1, 1)
+            grid_radius = (hazard_radius * grid_resolution / 20).long().view(-1, 1, 1)
+            
+            dist_sq = (xx - center_x)**2 + (yy - center_y)**2
+            inside = dist_sq < grid_radius**2
+            values = hazard_intensity.view(-1, 1, 1) * (1 - torch.sqrt(dist_sq.float()) / grid_radius)
+            
+            # Later hazards overwrite earlier ones where they overlap
+            order = torch.arange(len(hazards), device=self.device).view(-1, 1, 1)
+            for field, type_mask in ((fire_field, is_fire), (structural_damage, is_structural)):
+                last = torch.where(inside & type_mask.view(-1, 1, 1), order, -1).max(dim=0).values
+                covered = last >= 0
+                field[covered] = values.gather(0, last.clamp(min=0).unsqueeze(0)).squeeze(0)[covered]
         
         # Extract walls and exits
         walls = building_layout.get('walls', [])
@@ -107,159 +342,140 @@ class MacroscopicModel:
             end_x = int(end[0] * grid_resolution / 20)
             end_y = int(end[1] * grid_resolution / 20)
             
-            # Use Bresenham's algorithm to draw the wall
-            dx = abs(end_x - start_x)
-            dy = abs(end_y - start_y)
-            sx = 1 if start_x < end_x else -1
-            sy = 1 if start_y < end_y else -1
-            err = dx - dy
+            # Sample one point per grid cell along the wall and scatter them into the mask
+            wall_dx = abs(end_x - start_x)
+            wall_dy = abs(end_y - start_y)
+            t_samples = torch.linspace(0, 1, max(wall_dx, wall_dy) + 1, device=self.device)
+            xs = torch.round(start_x + t_samples * (end_x - start_x)).long()
+            ys = torch.round(start_y + t_samples * (end_y - start_y)).long()
             
-            x, y = start_x, start_y
-            while not (x == end_x and y == end_y):
-                if 0 <= x < grid_resolution and 0 <= y < grid_resolution:
-                    wall_mask[y, x] = True
-                e2 = 2 * err
-                if e2 > -dy:
-                    err -= dy
-                    x += sx
-                if e2 < dx:
-                    err += dx
-                    y += sy
-            
-            if 0 <= end_x < grid_resolution and 0 <= end_y < grid_resolution:
-                wall_mask[end_y, end_x] = True
+            inside = (xs >= 0) & (xs < grid_resolution) & (ys >= 0) & (ys < grid_resolution)
+            wall_mask.index_put_((ys[inside], xs[inside]), torch.tensor(True, device=self.device))
         
         # Create exit field for attraction
         exit_field = torch.zeros((grid_resolution, grid_resolution), device=self.device)
-        for exit_pos in exits:
-            # Convert to grid indices
-            exit_x = int(exit_pos[0] * grid_resolution / 20)
-            exit_y = int(exit_pos[1] * grid_resolution / 20)
+        if exits:
+            # Convert to grid indices, shaped (num_exits, 1, 1) to broadcast over the grid
+            exit_pos = torch.tensor(exits, dtype=torch.float64, device=self.device).reshape(-1, 2)
+            exit_x = (exit_pos[:, 0] * grid_resolution / 20).long().view(-1, 1, 1)
+            exit_y = (exit_pos[:, 1] * grid_resolution / 20).long().view(-1, 1, 1)
             
             # Set strong exit attraction in small area
             exit_radius = max(1, int(0.5 * grid_resolution / 20))
-            for y in range(grid_resolution):
-                for x in range(grid_resolution):
-                    dist = np.sqrt((x - exit_x)**2 + (y - exit_y)**2)
-                    if dist < exit_radius:
-                        exit_field[y, x] = 1.0
+            near_exit = ((xx - exit_x)**2 + (yy - exit_y)**2 < exit_radius**2).any(dim=0)
+            exit_field[near_exit] = 1.0
         
         # Initialize solution arrays
-        density_history = torch.zeros(time_steps, grid_resolution, grid_resolution, device=self.device)
-        velocity_x_history = torch.zeros(time_steps, grid_resolution, grid_resolution, device=self.device)
-        velocity_y_history = torch.zeros(time_steps, grid_resolution, grid_resolution, device=self.device)
-        fire_history = torch.zeros(time_steps, grid_resolution, grid_resolution, device=self.device)
+        # Field histories are stored in reduced precision (visualization only needs ~3 digits).
+        # On GPU they live in pinned host memory and are filled by asynchronous copies on a
+        # side stream, so the transfer overlaps with the next step instead of holding VRAM
+        pin_history = self.device.type == 'cuda'
+        copy_stream = torch.cuda.Stream() if pin_history else None
+        n_snapshots = (time_steps + snapshot_stride - 1) // snapshot_stride
+        density_history = torch.empty(n_snapshots, grid_resolution, grid_resolution, dtype=self.history_dtype, pin_memory=pin_history)
+        velocity_x_history = torch.empty(n_snapshots, grid_resolution, grid_resolution, dtype=self.history_dtype, pin_memory=pin_history)
+        velocity_y_history = torch.empty(n_snapshots, grid_resolution, grid_resolution, dtype=self.history_dtype, pin_memory=pin_history)
+        fire_history = torch.empty(n_snapshots, grid_resolution, grid_resolution, dtype=self.history_dtype, pin_memory=pin_history)
         evacuated_count = torch.zeros(time_steps, device=self.device)
         
-        # Create velocity field from exit potential
-        def update_velocity_field():
-            # Use distance to nearest exit to create potential
-            potential = torch.zeros((grid_resolution, grid_resolution), device=self.device) + 1000.0
-            
-            # For each exit, calculate distance field
-            for exit_pos in exits:
-                exit_x = int(exit_pos[0] * grid_resolution / 20)
-                exit_y = int(exit_pos[1] * grid_resolution / 20)
-                
-                for y in range(grid_resolution):
-                    for x in range(grid_resolution):
-                        if not wall_mask[y, x]:  # Skip walls
-                            dist = np.sqrt((x - exit_x)**2 + (y - exit_y)**2)
-                            potential[y, x] = min(potential[y, x], dist)
-            
-            # Calculate potential gradient
-            grad_y, grad_x = torch.gradient(potential)
-            
-            # Normalize gradient to create unit vector field
-            velocity_x = torch.zeros_like(grad_x)
-            velocity_y = torch.zeros_like(grad_y)
-            
-            mag = torch.sqrt(grad_x**2 + grad_y**2)
-            mask = mag > 0
-            velocity_x[mask] = -grad_x[mask] / mag[mask]  # Negative gradient points toward exits
-            velocity_y[mask] = -grad_y[mask] / mag[mask]
-            
-            # Zero velocity at walls
-            velocity_x[wall_mask] = 0
-            velocity_y[wall_mask] = 0
-            
-            return velocity_x, velocity_y
+        # Exit potential only depends on walls and exits, so the base velocity
+        # field is computed once; fire avoidance is applied on top of it later
+        # Use distance to nearest exit to create potential
+        potential = torch.zeros((grid_resolution, grid_resolution), device=self.device) + 1000.0
+        for exit_pos in exits:
+            exit_x = int(exit_pos[0] * grid_resolution / 20)
+            exit_y = int(exit_pos[1] * grid_resolution / 20)
+            dist = torch.sqrt(((xx - exit_x)**2 + (yy - exit_y)**2).float())
+            potential = torch.minimum(potential, dist)
+        potential[wall_mask] = 1000.0  # Skip walls
+        
+        # Calculate potential gradient
+        grad_y, grad_x = _central_gradient(potential)
+        
+        # Normalize gradient to create unit vector field
+        base_velocity_x = torch.zeros_like(grad_x)
+        base_velocity_y = torch.zeros_like(grad_y)
+        
+        mag = torch.sqrt(grad_x**2 + grad_y**2)
+        mask = mag > 0
+        base_velocity_x[mask] = -grad_x[mask] / mag[mask]  # Negative gradient points toward exits
+        base_velocity_y[mask] = -grad_y[mask] / mag[mask]
+        
+        # Zero velocity at walls
+        base_velocity_x[wall_mask] = 0
+        base_velocity_y[wall_mask] = 0
         
         # Calculate initial velocity field
-        velocity_x, velocity_y = update_velocity_field()
+        velocity_x, velocity_y = base_velocity_x, base_velocity_y
+        
+        # The fire spread stencil [[0.05, 0.2, 0.05], [0.2, 0, 0.2], [0.05, 0.2, 0.05]] is the
+        # outer product of [1, 4, 1] and [0.05, 0.2, 0.05] minus 0.8 at the center
+        fire_kernel_x = torch.tensor([0.05, 0.2, 0.05], device=self.device).view(1, 1, 1, 3)
+        fire_kernel_y = torch.tensor([1.0, 4.0, 1.0], device=self.device).view(1, 1, 3, 1)
+        
+        # Transport stencils for the (flux_x, flux_y, density) channels: central differences
+        # for the flux divergence and the 5-point Laplacian scaled by the diffusion coefficient
+        transport_kernel = torch.zeros((1, 3, 3, 3), device=self.device)
+        transport_kernel[0, 0, 1, 0], transport_kernel[0, 0, 1, 2] = 1 / (2 * dx), -1 / (2 * dx)
+        transport_kernel[0, 1, 0, 1], transport_kernel[0, 1, 2, 1] = 1 / (2 * dx), -1 / (2 * dx)
+        transport_kernel[0, 2] = self.diffusion_coefficient * torch.tensor(
+            [[0.0, 1.0, 0.0], [1.0, -4.0, 1.0], [0.0, 1.0, 0.0]], device=self.device
+        ) / (dx * dx)
+        
+        if self.device.type == 'cuda':
+            # Replay the fused step from a captured CUDA graph to avoid per-kernel launch
+            # overhead; the warm-up runs before capture compile it. Density and fire change
+            # every step and the velocities every 10 steps; the exit field, wall mask and
+            # stencils are used in place
+            pde_step = _CudaGraphStep(
+                _pde_step_compiled if self.use_compile else _pde_step,
+                (density, velocity_x, velocity_y, fire_field, exit_field, wall_mask,
+                 fire_kernel_x, fire_kernel_y, transport_kernel,
+                 self.diffusion_coefficient, self.evacuation_coefficient, self.fire_coupling, dt, dx),
+                dynamic_args=(0, 1, 2, 3)
+            )
+        elif NUMBA_AVAILABLE:
+            pde_step = _NumbaStep(density)
+        else:
+            pde_step = _pde_step_compiled if self.use_compile else _pde_step
+        
+        # Reused buffers for the fire gradient in the velocity update
+        fire_grad_y = torch.empty_like(fire_field)
+        fire_grad_x = torch.empty_like(fire_field)
         
         # Main simulation loop
         for t in range(time_steps):
-            # Store current state
-            density_history[t] = density
-            velocity_x_history[t] = velocity_x
-            velocity_y_history[t] = velocity_y
-            fire_history[t] = fire_field
-            
-            # Update fire field (simple model: fire spreads to neighbors)
-            if torch.sum(fire_field) > 0:
-                fire_spread = torch.zeros_like(fire_field)
-                # Use 2D convolution for diffusion
-                fire_spread = torch.nn.functional.conv2d(
-                    fire_field.unsqueeze(0).unsqueeze(0),
-                    torch.tensor([[0.05, 0.2, 0.05], 
-                                  [0.2, 0.0, 0.2], 
-                                  [0.05, 0.2, 0.05]], device=self.device).unsqueeze(0).unsqueeze(0),
-                    padding=1
-                ).squeeze()
-                fire_field = torch.clamp(fire_field + 0.1 * fire_spread, 0, 1.0)
-                
-                # Fire doesn't spread through walls
-                fire_field[wall_mask] = 0
-            
-            # Calculate density flux
-            flux_x = velocity_x * density
-            flux_y = velocity_y * density
-            
-            # Divergence of flux
-            div_x = torch.zeros_like(flux_x)
-            div_y = torch.zeros_like(flux_y)
-            
-            div_x[1:-1, 1:-1] = (flux_x[1:-1, 2:] - flux_x[1:-1, :-2]) / (2 * dx)
-            div_y[1:-1, 1:-1] = (flux_y[2:, 1:-1] - flux_y[:-2, 1:-1]) / (2 * dx)
-            
-            # Diffusion term (Laplacian)
-            laplacian = torch.zeros_like(density)
-            laplacian[1:-1, 1:-1] = (
-                density[1:-1, 2:] + density[1:-1, :-2] + 
-                density[2:, 1:-1] + density[:-2, 1:-1] - 
-                4 * density[1:-1, 1:-1]
-            ) / (dx * dx)
-            
-            # Evacuation term (density decreases at exits)
-            evacuation = self.evacuation_coefficient * exit_field * density
-            
-            # Hazard avoidance (density decreases in fire areas)
-            hazard_effect = self.fire_coupling * fire_field * density
-            
-            # Update density using the full PDE
-            density_new = density - dt * (div_x + div_y) + dt * self.diffusion_coefficient * laplacian - dt * evacuation - dt * hazard_effect
-            
-            # No negative density
-            density_new = torch.clamp(density_new, min=0.0)
-            
-            # No density at walls
-            density_new[wall_mask] = 0
-            
-            # Track evacuated people (disappeared at exits)
-            evacuated_count[t] = torch.sum(dt * evacuation)
-            
-            # Update for next iteration
-            density = density_new
+            # Store a snapshot of the current state every snapshot_stride steps
+            if t % snapshot_stride == 0:
+                snapshot = t // snapshot_stride
+                if copy_stream is not None:
+                    copy_stream.wait_stream(torch.cuda.current_stream())
+                    with torch.cuda.stream(copy_stream):
+                        for history, field in ((density_history, density), (velocity_x_history, velocity_x),
+                                               (velocity_y_history, velocity_y), (fire_history, fire_field)):
+                            history[snapshot].copy_(field, non_blocking=True)
+                            field.record_stream(copy_stream)  # Keep the allocator from reusing it mid-copy
+                else:
+                    density_history[snapshot] = density
+                    velocity_x_history[snapshot] = velocity_x
+                    velocity_y_history[snapshot] = velocity_y
+                    fire_history[snapshot] = fire_field
+            
+            # Update fire and density using the full PDE in one fused step
+            density, fire_field, evacuated_count[t] = pde_step(
+                density, velocity_x, velocity_y, fire_field, exit_field, wall_mask,
+                fire_kernel_x, fire_kernel_y, transport_kernel,
+                self.diffusion_coefficient, self.evacuation_coefficient, self.fire_coupling, dt, dx
+            )
             
             # Recalculate velocity field occasionally
             if t % 10 == 0:
-                velocity_x, velocity_y = update_velocity_field()
+                velocity_x, velocity_y = base_velocity_x, base_velocity_y
                 
                 # Modify velocity field to avoid fire
                 if torch.sum(fire_field) > 0:
                     # Calculate gradient of fire field
-                    fire_grad_y, fire_grad_x = torch.gradient(fire_field)
+                    fire_grad_y, fire_grad_x = _central_gradient(fire_field, fire_grad_y, fire_grad_x)
                     
                     # Add avoidance component to velocity field
                     fire_magnitude = torch.sqrt(fire_grad_x**2 + fire_grad_y**2)
@@ -285,16 +501,24 @@ class MacroscopicModel:
                         velocity_x[mask] = velocity_x[mask] / mag[mask]
                         velocity_y[mask] = velocity_y[mask] / mag[mask]
         
-        # Convert results to CPU and numpy for serialization
+        # Wait for the outstanding history copies before handing the buffers to NumPy
+        if copy_stream is not None:
+            copy_stream.synchronize()
+        
+        # Convert results to CPU and numpy for serialization. The field histories hold
+        # n_snapshots frames, dt_effective apart; evacuated_count keeps one entry per time step
         results = {
-            'density': density_history.cpu().numpy(),
-            'velocity_x': velocity_x_history.cpu().numpy(),
-            'velocity_y': velocity_y_history.cpu().numpy(),
-            'fire': fire_history.cpu().numpy(),
+            'density': density_history.float().numpy(),
+            'velocity_x': velocity_x_history.float().numpy(),
+            'velocity_y': velocity_y_history.float().numpy(),
+            'fire': fire_history.float().numpy(),
             'evacuated_count': evacuated_count.cpu().numpy(),
             'grid_resolution': grid_resolution,
             'time_steps': time_steps,
-            'dt': dt
+            'n_snapshots': n_snapshots,
+            'snapshot_stride': snapshot_stride,
+            'dt': dt,
+            'dt_effective': dt * snapshot_stride  # Time between stored snapshots
         }
         
         return results
@@ -310,62 +534,59 @@ class MacroscopicModel:
         t = torch.rand(n_points, device=self.device)
         
         # Pack into input tensor
-        X = torch.stack([x, y, t], dim=1).requires_grad_(True)
+        X = torch.stack([x, y, t], dim=1)
         
         # Extract building layout and hazard information
-        exits = torch.tensor(building_layout.get('exits', []), device=self.device)
-        hazard_positions = torch.tensor([h['position'] for h in hazards], device=self.device)
+        exits = torch.tensor(building_layout.get('exits', []), dtype=torch.float32, device=self.device).reshape(-1, 2)
+        hazard_positions = torch.tensor([h['position'] for h in hazards], dtype=torch.float32, device=self.device).reshape(-1, 2)
         hazard_intensities = torch.tensor([h.get('intensity', 1.0) for h in hazards], device=self.device)
         
+        # Source terms only depend on the fixed collocation points, so the distances to
+        # all exits and hazards are evaluated once as (n_points, E) and (n_points, H) matrices
+        dist_to_exits = torch.sqrt((X[:, 0:1] - exits[:, 0] / 20)**2 + (X[:, 1:2] - exits[:, 1] / 20)**2)
+        exit_weight = torch.exp(-dist_to_exits / 0.1).sum(dim=1, keepdim=True)
+        
+        dist_to_hazards = torch.sqrt((X[:, 0:1] - hazard_positions[:, 0] / 20)**2 + (X[:, 1:2] - hazard_positions[:, 1] / 20)**2)
+        hazard_weight = (hazard_intensities * torch.exp(-dist_to_hazards / 0.1)).sum(dim=1, keepdim=True)
+        
+        def density_at(params, point):
+            """PINN density at a single (x, y, t) point as a function of the network parameters."""
+            return functional_call(self.pinn, params, (point.unsqueeze(0),)).squeeze()
+        
         # Number of training iterations
         n_iterations = 5000
         
         for i in range(n_iterations):
-            # Forward pass through the network
-            density = self.pinn(X)
-            
-            # Calculate derivatives using autograd
-            density_x = torch.autograd.grad(
-                density, X, torch.ones_like(density), create_graph=True
-            )[0][:, 0].view(-1, 1)
-            
-            density_y = torch.autograd.grad(
-                density, X, torch.ones_like(density), create_graph=True
-            )[0][:, 1].view(-1, 1)
-            
-            density_t = torch.autograd.grad(
-                density, X, torch.ones_like(density), create_graph=True
-            )[0][:, 2].view(-1, 1)
-            
-            # Calculate second derivatives
-            density_xx = torch.autograd.grad(
-                density_x, X, torch.ones_like(density_x), create_graph=True
-            )[0][:, 0].view(-1, 1)
-            
-            density_yy = torch.autograd.grad(
-                density_y, X, torch.ones_like(density_y), create_graph=True
-            )[0][:, 1].view(-1, 1)
-            
-            # Calculate Laplacian
-            laplacian = density_xx + density_yy
+            # Mixed precision on GPU; parameters and optimizer state stay in FP32
+            with torch.autocast(device_type=self.device.type, dtype=torch.bfloat16, enabled=self.device.type == 'cuda'):
+                # Density and its derivatives as per-point functions of (x, y, t), batched
+                # over all collocation points in one pass instead of chained autograd.grad calls
+                params = dict(self.pinn.named_parameters())
+                density = vmap(density_at, in_dims=(None, 0))(params, X).view(-1, 1)
+                
+                # First derivatives
+                grad_density = vmap(grad(density_at, argnums=1), in_dims=(None, 0))(params, X)
+                density_t = grad_density[:, 2:3]
+                
+                # Second derivatives from the diagonal of the per-point Hessian
+                hessian_density = vmap(hessian(density_at, argnums=1), in_dims=(None, 0))(params, X)
+                density_xx = hessian_density[:, 0, 0].view(-1, 1)
+                density_yy = hessian_density[:, 1, 1].view(-1, 1)
+                
+                # Calculate Laplacian
+                laplacian = density_xx + density_yy
             
-            # Calculate evacuation term (density decreases near exits)
-            evacuation_term = torch.zeros((n_points, 1), device=self.device)
-            for exit_pos in exits:
-                dist_to_exit = torch.sqrt((X[:, 0] - exit_pos[0]/20)**2 + (X[:, 1] - exit_pos[1]/20)**2)
-                evacuation_term += torch.exp(-dist_to_exit / 0.1).view(-1, 1) * density
+                # Calculate evacuation term (density decreases near exits)
+                evacuation_term = exit_weight * density
             
-            # Calculate hazard term
-            hazard_term = torch.zeros((n_points, 1), device=self.device)
-            for pos, intensity in zip(hazard_positions, hazard_intensities):
-                dist_to_hazard = torch.sqrt((X[:, 0] - pos[0]/20)**2 + (X[:, 1] - pos[1]/20)**2)
-                hazard_term += intensity * torch.exp(-dist_to_hazard / 0.1).view(-1, 1) * density
+                # Calculate hazard term
+                hazard_term = hazard_weight * density
             
-            # PDE residual: density_t - D*laplacian + evacuation_term + hazard_term = 0
-            residual = density_t - self.diffusion_coefficient * laplacian + self.evacuation_coefficient * evacuation_term + self.fire_coupling * hazard_term
+                # PDE residual: density_t - D*laplacian + evacuation_term + hazard_term = 0
+                residual = density_t - self.diffusion_coefficient * laplacian + self.evacuation_coefficient * evacuation_term + self.fire_coupling * hazard_term
             
-            # Loss function
-            loss = torch.mean(residual**2)
+                # Loss function
+                loss = torch.mean(residual.float()**2)
             
             # Backward and optimize
             self.optimizer.zero_grad()
@@ -377,7 +598,7 @@ class MacroscopicModel:
         
         print("PINN training completed.")
         
-    def simulate(self, grid_resolution=100, time_steps=100, building_layout=None, hazards=None, use_pinn=False):
+    def simulate(self, grid_resolution=100, time_steps=100, building_layout=None, hazards=None, use_pinn=False, snapshot_stride=1):
         """
         Run a macroscopic simulation using PDE models.
         
@@ -387,14 +608,20 @@ class MacroscopicModel:
             building_layout: Dict with walls, exits, and initial positions
             hazards: List of hazard locations and properties
             use_pinn: Whether to use Physics-Informed Neural Networks
+            snapshot_stride: Store the fields of every snapshot_stride-th time step only
             
         Returns:
-            Dict containing simulation results
+            Dict containing simulation results. The density, velocity and fire histories are
+            (n_snapshots, grid_resolution, grid_resolution) with n_snapshots =
+            ceil(time_steps / snapshot_stride); evacuated_count is (time_steps,)
         """
+        if snapshot_stride < 1:
+            raise ValueError("snapshot_stride must be at least 1")
+        
         # Check for mock mode first
         if os.environ.get('DEV_MODE') == 'mock':
             logger.info("Using mock data for macroscopic simulation")
-            return self._generate_mock_results(grid_resolution, time_steps, building_layout, hazards)
+            return self._generate_mock_results(grid_resolution, time_steps, building_layout, hazards, snapshot_stride)
         
         # Only initialize PINN if requested (expensive operation)
         if use_pinn:
@@ -402,9 +629,9 @@ class MacroscopicModel:
             # Train and use the PINN...
             
         # Use finite difference method by default
-        return self._solve_pde_finite_difference(grid_resolution, time_steps, building_layout or {}, hazards or [])
+        return self._solve_pde_finite_difference(grid_resolution, time_steps, building_layout or {}, hazards or [], snapshot_stride)
     
-    def _generate_mock_results(self, grid_resolution, time_steps, building_layout, hazards):
+    def _generate_mock_results(self, grid_resolution, time_steps, building_layout, hazards, snapshot_stride=1):
         """Generate mock simulation results for quick testing."""
         import numpy as np
         from time import time
@@ -423,56 +650,52 @@ class MacroscopicModel:
         fire = np.zeros((time_steps, grid_resolution, grid_resolution))
         evacuated_count = np.zeros(time_steps)
         
+        # Grid coordinates for the vectorized field construction
+        ii, jj = np.meshgrid(np.arange(grid_resolution), np.arange(grid_resolution), indexing='ij')
+        
         # Initial density in center
         center = grid_resolution // 2
-        for i in range(grid_resolution):
-            for j in range(grid_resolution):
-                dist = np.sqrt((i - center)**2 + (j - center)**2)
-                if dist < grid_resolution // 4:
-                    density[0, i, j] = np.exp(-dist / (grid_resolution / 8))
+        dist_center = np.sqrt((ii - center)**2 + (jj - center)**2)
+        density[0] = np.where(dist_center < grid_resolution // 4, np.exp(-dist_center / (grid_resolution / 8)), 0.0)
         
         # Simple fire spread in corner
         fire_x, fire_y = grid_resolution // 5, grid_resolution // 5
-        for i in range(grid_resolution):
-            for j in range(grid_resolution):
-                dist = np.sqrt((i - fire_x)**2 + (j - fire_y)**2)
-                if dist < grid_resolution // 10:
-                    fire[0, i, j] = np.exp(-dist / (grid_resolution / 15))
+        dist_fire = np.sqrt((ii - fire_x)**2 + (jj - fire_y)**2)
+        fire[0] = np.where(dist_fire < grid_resolution // 10, np.exp(-dist_fire / (grid_resolution / 15)), 0.0)
         
         # Simple time evolution
-        for t in range(1, time_steps):
-            # Evacuate people over time
-            evac_rate = (t / time_steps) ** 0.8  # Non-linear evacuation curve
-            evacuated_count[t] = 500 * evac_rate
-            
-            # Reduce density according to evacuation
-            density[t] = density[0] * (1 - evac_rate)
-            
-            # Expand fire for first half of simulation
-            if t < time_steps // 2:
-                fire[t] = np.minimum(fire[t-1] * 1.05, 1.0)
-            else:
-                fire[t] = fire[t-1]
-            
-            # Set velocity field (radial from center for simplicity)
-            for i in range(grid_resolution):
-                for j in range(grid_resolution):
-                    dx = i - center
-                    dy = j - center
-                    dist = max(0.1, np.sqrt(dx*dx + dy*dy))
-                    velocity_x[t, i, j] = dx / dist
-                    velocity_y[t, i, j] = dy / dist
+        t = np.arange(1, time_steps)
+        
+        # Evacuate people over time
+        evac_rate = (t / time_steps) ** 0.8  # Non-linear evacuation curve
+        evacuated_count[1:] = 500 * evac_rate
+        
+        # Reduce density according to evacuation
+        density[1:] = density[0] * (1 - evac_rate)[:, None, None]
+        
+        # Expand fire by 5% per step for the first half of the simulation, then hold it
+        growth_steps = np.minimum(np.arange(time_steps), max(time_steps // 2 - 1, 0))
+        fire[:] = np.minimum(fire[0] * 1.05 ** growth_steps[:, None, None], 1.0)
+        
+        # Set velocity field (radial from center for simplicity); it is time-invariant
+        dist = np.maximum(0.1, dist_center)
+        velocity_x[1:] = (ii - center) / dist
+        velocity_y[1:] = (jj - center) / dist
         
         logger.info(f"Mock data generation completed in {time() - start_time:.2f} seconds")
         
+        # Keep every snapshot_stride-th frame of the fields, as the solver does
         return {
-            'density': density.tolist(),
-            'velocity_x': velocity_x.tolist(),
-            'velocity_y': velocity_y.tolist(),
-            'fire': fire.tolist(),
-            'evacuated_count': evacuated_count.tolist(),
+            'density': density[::snapshot_stride],
+            'velocity_x': velocity_x[::snapshot_stride],
+            'velocity_y': velocity_y[::snapshot_stride],
+            'fire': fire[::snapshot_stride],
+            'evacuated_count': evacuated_count,
             'grid_resolution': grid_resolution,
             'time_steps': time_steps,
+            'n_snapshots': len(density[::snapshot_stride]),
+            'snapshot_stride': snapshot_stride,
             'dt': 0.1,
+            'dt_effective': 0.1 * snapshot_stride,
             'mock_data': True
         }
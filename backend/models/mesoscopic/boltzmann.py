@@ -1,22 +1,180 @@
 import numpy as np
 import torch
+import torch.nn.functional as F
 import os
 import logging
 
+try:
+    from numba import njit, prange
+    NUMBA_AVAILABLE = True
+except ImportError:  # Numba is optional; without it the CPU path uses the torch step
+    NUMBA_AVAILABLE = False
+    prange = range
+    def njit(*args, **kwargs):
+        return lambda fn: fn
+
+try:
+    import triton
+    import triton.language as tl
+    TRITON_AVAILABLE = True
+except ImportError:  # Triton is optional; without it the GPU path uses the compiled torch step
+    TRITON_AVAILABLE = False
+
 logger = logging.getLogger(__name__)
 
+# Grids smaller than this run the Numba step on CPU, where per-op dispatch would dominate
+NUMBA_MAX_GRID_SIZE = 256
+
+# Grids with fewer cells than this (64 x 64) run on CPU even when a GPU is requested; at
+# that size kernel launch overhead per step outweighs the GPU arithmetic entirely
+GPU_MIN_GRID_CELLS = 4096
+
+@njit(parallel=True, fastmath=True, cache=True)
+def _boltzmann_step_kernel(f, velocities, wall_mask, hazard_drift, exit_drift, shifts, dt, density_threshold,
+                           f_out, density, velocity_x, velocity_y):
+    """
+    Single CPU kernel for BoltzmannModel._step.
+    
+    f and the drifts are (rows, cols, velocities), so the per-cell loops over
+    velocities walk contiguous memory.
+    
+    Collision, hazard and exit drift are local to each cell and run in a first pass
+    (which also writes the macroscopic fields); streaming and wall boundaries pull
+    from the post-collision distribution in a second pass.
+    """
+    n_rows, n_cols, num_velocities = f.shape
+    post = np.empty_like(f)
+    
+    for y in prange(n_rows):
+        for x in range(n_cols):
+            # Macroscopic fields at the start of the step
+            rho = 0.0
+            momentum_x = 0.0
+            momentum_y = 0.0
+            for v in range(num_velocities):
+                rho += f[y, x, v]
+                momentum_x += f[y, x, v] * velocities[v, 0]
+                momentum_y += f[y, x, v] * velocities[v, 1]
+            density[y, x] = rho
+            if rho > 1e-5:
+                velocity_x[y, x] = momentum_x / rho
+                velocity_y[y, x] = momentum_y / rho
+            else:
+                velocity_x[y, x] = 0.0
+                velocity_y[y, x] = 0.0
+            
+            # BGK collision towards the uniform equilibrium, slower in crowded areas
+            relaxation_time = 2.0 if rho > density_threshold else 1.0
+            rho_collided = 0.0
+            for v in range(num_velocities):
+                post[y, x, v] = f[y, x, v] - dt * (f[y, x, v] - rho / num_velocities) / relaxation_time
+                rho_collided += post[y, x, v]
+            
+            # Hazard repulsion (capped by the local density) and exit attraction
+            for v in range(num_velocities):
+                post[y, x, v] += min(hazard_drift[y, x, v], rho_collided) + exit_drift[y, x, v]
+    
+    for y in prange(n_rows):
+        for x in range(n_cols):
+            for v in range(num_velocities):
+                # Streaming: pull from the upstream cell; nothing enters from outside the grid
+                source_x = x - shifts[v, 0]
+                source_y = y - shifts[v, 1]
+                value = 0.0
+                if not wall_mask[y, x] and 0 <= source_x < n_cols and 0 <= source_y < n_rows:
+                    value = post[source_y, source_x, v]
+                f_out[y, x, v] = value
+
+if TRITON_AVAILABLE:
+    @triton.jit
+    def _boltzmann_step_triton(f_ptr, velocities_ptr, shifts_ptr, wall_ptr, hazard_drift_ptr, exit_drift_ptr,
+                               f_out_ptr, density_ptr, velocity_x_ptr, velocity_y_ptr,
+                               grid_size, dt, density_threshold,
+                               NUM_VELOCITIES: tl.constexpr, BLOCK: tl.constexpr):
+        """
+        Fused GPU kernel for BoltzmannModel._step over one BLOCK x BLOCK tile.
+        
+        Macroscopic fields, collision, hazard and exit drift stay in registers; each
+        post-collision value is stored straight to its streamed destination, so f is
+        read and written once per step. f and the drifts are (rows, cols, velocities), so
+        the velocities of a cell share cache lines. Loads are widened to FP32, so f may be
+        stored in reduced precision. f_out must be zero-initialized.
+        """
+        rows = tl.program_id(0) * BLOCK + tl.arange(0, BLOCK)[:, None]
+        cols = tl.program_id(1) * BLOCK + tl.arange(0, BLOCK)[None, :]
+        inside = (rows < grid_size) & (cols < grid_size)
+        cell = rows * grid_size + cols
+        
+        # Macroscopic fields at the start of the step
+        rho = tl.zeros((BLOCK, BLOCK), dtype=tl.float32)
+        momentum_x = tl.zeros((BLOCK, BLOCK), dtype=tl.float32)
+        momentum_y = tl.zeros((BLOCK, BLOCK), dtype=tl.float32)
+        for v in tl.static_range(NUM_VELOCITIES):
+            f_v = tl.load(f_ptr + cell * NUM_VELOCITIES + v, mask=inside, other=0.0).to(tl.float32)
+            rho += f_v
+            momentum_x += f_v * tl.load(velocities_ptr + 2 * v)
+            momentum_y += f_v * tl.load(velocities_ptr + 2 * v + 1)
+        occupied = rho > 1e-5
+        safe_rho = tl.where(occupied, rho, 1.0)
+        tl.store(density_ptr + cell, rho, mask=inside)
+        tl.store(velocity_x_ptr + cell, tl.where(occupied, momentum_x / safe_rho, 0.0), mask=inside)
+        tl.store(velocity_y_ptr + cell, tl.where(occupied, momentum_y / safe_rho, 0.0), mask=inside)
+        
+        # BGK collision towards the uniform equilibrium, slower in crowded areas
+        relaxation_time = tl.where(rho > density_threshold, 2.0, 1.0)
+        rho_collided = tl.zeros((BLOCK, BLOCK), dtype=tl.float32)
+        for v in tl.static_range(NUM_VELOCITIES):
+            f_v = tl.load(f_ptr + cell * NUM_VELOCITIES + v, mask=inside, other=0.0).to(tl.float32)
+            rho_collided += f_v - dt * (f_v - rho / NUM_VELOCITIES) / relaxation_time
+        
+        for v in tl.static_range(NUM_VELOCITIES):
+            f_v = tl.load(f_ptr + cell * NUM_VELOCITIES + v, mask=inside, other=0.0).to(tl.float32)
+            value = f_v - dt * (f_v - rho / NUM_VELOCITIES) / relaxation_time
+            
+            # Hazard repulsion (capped by the local density) and exit attraction
+            hazard_drift = tl.load(hazard_drift_ptr + cell * NUM_VELOCITIES + v, mask=inside, other=0.0).to(tl.float32)
+            value += tl.minimum(hazard_drift, rho_collided)
+            value += tl.load(exit_drift_ptr + cell * NUM_VELOCITIES + v, mask=inside, other=0.0).to(tl.float32)
+            
+            # Streaming: push to the downstream cell, dropping particles that leave the
+            # grid or land on a wall
+            dest_rows = rows + tl.load(shifts_ptr + 2 * v + 1)
+            dest_cols = cols + tl.load(shifts_ptr + 2 * v)
+            in_grid = inside & (dest_rows >= 0) & (dest_rows < grid_size) & (dest_cols >= 0) & (dest_cols < grid_size)
+            dest = dest_rows * grid_size + dest_cols
+            open_cell = tl.load(wall_ptr + dest, mask=in_grid, other=1) == 0
+            tl.store(f_out_ptr + dest * NUM_VELOCITIES + v, value, mask=in_grid & open_cell)
+
 class BoltzmannModel:
     """
     Mesoscopic evacuation model using Boltzmann approach.
     Models crowd as a continuous density field with flow equations.
     """
     
-    def __init__(self, use_gpu=True):
-        self.device = torch.device("cuda" if torch.cuda.is_available() and use_gpu else "cpu")
+    def __init__(self, use_gpu=True, use_compile=True):
+        self.use_gpu = use_gpu and torch.cuda.is_available()
+        self.device = torch.device("cuda" if self.use_gpu else "cpu")
+        self.use_compile = use_compile  # Fuse each time step with torch.compile when available
+        # Storage precision of the distribution function and histories; BF16 halves the memory
+        # traffic of the bandwidth-bound GPU step, while sums still accumulate in FP32
+        self.state_dtype = torch.bfloat16 if self.device.type == 'cuda' else torch.float32
         self.diffusion_coefficient = 0.8
         self.density_threshold = 4.0  # People per square meter
         self.interaction_strength = 1.5
         
+        # Central-difference stencils producing (grad_x, grad_y) channels in one convolution
+        self.gradient_kernel = torch.tensor([
+            [[[0.0, 0.0, 0.0], [-0.5, 0.0, 0.5], [0.0, 0.0, 0.0]]],
+            [[[0.0, -0.5, 0.0], [0.0, 0.0, 0.0], [0.0, 0.5, 0.0]]],
+        ], device=self.device)
+        
+    def _select_device(self, grid_size):
+        """Run on the GPU only when one was requested and the grid is large enough to benefit."""
+        use_gpu = self.use_gpu and grid_size * grid_size >= GPU_MIN_GRID_CELLS
+        self.device = torch.device("cuda" if use_gpu else "cpu")
+        self.state_dtype = torch.bfloat16 if use_gpu else torch.float32
+        self.gradient_kernel = self.gradient_kernel.to(self.device)
+        
     def _initialize_distribution(self, grid_size, building_layout):
         """Initialize distribution function f(x,v,t) on the grid."""
         # Initial spatial density distribution
@@ -50,134 +208,143 @@ class BoltzmannModel:
             velocities[i, 0] = np.cos(angle)
             velocities[i, 1] = np.sin(angle)
             
-        # Full distribution function
-        f = torch.zeros((num_velocities, grid_size, grid_size), device=self.device)
+        # Full distribution function, laid out (grid_size, grid_size, num_velocities) so the
+        # velocities of each cell are contiguous
+        f = torch.zeros((grid_size, grid_size, num_velocities), device=self.device)
         
         # Initially uniform velocity distribution
         for i in range(num_velocities):
-            f[i] = density / num_velocities
+            f[..., i] = density / num_velocities
             
         return f, velocities
         
-    def _apply_boundary_conditions(self, f, building_layout, grid_size):
-        """Apply no-flux boundary conditions at walls."""
+    def _build_wall_mask(self, building_layout, grid_size):
+        """Rasterize the walls of the building layout into a boolean grid mask."""
         walls = building_layout.get('walls', [])
+        wall_mask = torch.zeros((grid_size, grid_size), dtype=torch.bool, device=self.device)
         
         # Convert wall coordinates to grid indices
-        wall_cells = []
+        wall_xs, wall_ys = [], []
         for wall in walls:
             start, end = wall[0], wall[1]
             # Convert to grid coordinates
             start_x, start_y = int(start[0] * grid_size / 20), int(start[1] * grid_size / 20)
             end_x, end_y = int(end[0] * grid_size / 20), int(end[1] * grid_size / 20)
             
-            # Generate all wall cells using Bresenham's line algorithm
+            # Interpolate one cell per step along the major axis. Rounding ties toward the
+            # start point reproduces the cells of Bresenham's line algorithm exactly
             dx = abs(end_x - start_x)
             dy = abs(end_y - start_y)
+            k = torch.arange(max(dx, dy) + 1, device=self.device)
+            steps = max(dx, dy, 1)
             sx = 1 if start_x < end_x else -1
             sy = 1 if start_y < end_y else -1
-            err = dx - dy
-            
-            x, y = start_x, start_y
-            while not (x == end_x and y == end_y):
-                if 0 <= x < grid_size and 0 <= y < grid_size:
-                    wall_cells.append((x, y))
-                e2 = 2 * err
-                if e2 > -dy:
-                    err -= dy
-                    x += sx
-                if e2 < dx:
-                    err += dx
-                    y += sy
-            
-            if 0 <= end_x < grid_size and 0 <= end_y < grid_size:
-                wall_cells.append((end_x, end_y))
+            wall_xs.append(start_x + sx * torch.div(2 * k * dx + steps - 1, 2 * steps, rounding_mode='floor'))
+            wall_ys.append(start_y + sy * torch.div(2 * k * dy + steps - 1, 2 * steps, rounding_mode='floor'))
         
-        # Apply no-flux condition at walls
-        for x, y in wall_cells:
-            f[:, y, x] = 0  # Zero distribution at walls
+        if walls:
+            xs, ys = torch.cat(wall_xs), torch.cat(wall_ys)
+            inside = (xs >= 0) & (xs < grid_size) & (ys >= 0) & (ys < grid_size)
+            wall_mask.index_put_((ys[inside], xs[inside]), torch.tensor(True, device=self.device))
             
-        return f
+        return wall_mask
+        
+    def _apply_boundary_conditions(self, f, wall_mask):
+        """Apply no-flux boundary conditions at walls."""
+        # Zero distribution at walls, as one out-of-place select so the step never mutates its input
+        return torch.where(wall_mask.unsqueeze(-1), 0.0, f)
+    
+    def _gradient(self, field):
+        """
+        Gradient of a 2D field, matching torch.gradient(field).
+        
+        Interior cells come from a single convolution with fixed central-difference
+        kernels; the edges use one-sided differences.
+        
+        Returns:
+            Tuple of (grad_y, grad_x)
+        """
+        grad_x, grad_y = F.conv2d(field[None, None], self.gradient_kernel, padding=1)[0]
+        
+        grad_x[:, 0] = field[:, 1] - field[:, 0]
+        grad_x[:, -1] = field[:, -1] - field[:, -2]
+        grad_y[0] = field[1] - field[0]
+        grad_y[-1] = field[-1] - field[-2]
+        
+        return grad_y, grad_x
     
     def _compute_macroscopic_fields(self, f):
         """Compute macroscopic density and momentum from distribution function."""
         # Sum over all velocities to get density
-        density = torch.sum(f, dim=0)
+        density = torch.sum(f, dim=-1)
         
-        # Calculate momentum in x and y directions
-        momentum_x = torch.sum(f * self.velocities[:, 0].view(-1, 1, 1), dim=0)
-        momentum_y = torch.sum(f * self.velocities[:, 1].view(-1, 1, 1), dim=0)
+        # Calculate momentum in x and y directions as one (2, H, W) reduction
+        momentum = torch.einsum('hwv,vd->dhw', f, self._velocity_table)
         
         # Calculate velocity field (handle zero density)
-        velocity_x = torch.zeros_like(density)
-        velocity_y = torch.zeros_like(density)
-        
-        mask = density > 1e-5
-        velocity_x[mask] = momentum_x[mask] / density[mask]
-        velocity_y[mask] = momentum_y[mask] / density[mask]
+        velocity = torch.where(density > 1e-5, momentum / density.clamp_min(1e-5), 0.0)
         
-        return density, velocity_x, velocity_y
+        return density, velocity[0], velocity[1]
     
     def _collision_step(self, f, density):
         """Model interactions between agents (collision term in Boltzmann equation)."""
-        num_velocities = f.shape[0]
-        grid_size = f.shape[1]
-        
-        # Compute equilibrium distribution (where system would relax to)
-        f_eq = torch.zeros_like(f)
+        num_velocities = f.shape[-1]
         
         # Simplified BGK collision operator
-        # Relaxation towards local equilibrium
-        relaxation_time = torch.ones_like(density)
+        # Relaxation towards local equilibrium, slower in crowded areas
+        relaxation_time = torch.where(density > self.density_threshold, 2.0, 1.0)
         
-        # Density-dependent relaxation (slower in crowded areas)
-        mask = density > self.density_threshold
-        relaxation_time[mask] = 2.0  # Slower relaxation in high density
-        
-        # Calculate equilibrium distribution for each direction
-        for i in range(num_velocities):
-            # Assuming equal probability of each direction in equilibrium
-            f_eq[i] = density / num_velocities
+        # Equilibrium distribution (where system would relax to), assuming equal
+        # probability of each direction; broadcasts over the velocity axis
+        f_eq = (density / num_velocities).unsqueeze(-1)
             
         # Update f through collision term
         # df/dt = -(f - f_eq)/tau
-        collision_term = -(f - f_eq) / relaxation_time.unsqueeze(0)
+        collision_term = -(f - f_eq) / relaxation_time.unsqueeze(-1)
         
         return collision_term
         
-    def _streaming_step(self, f, dt):
-        """Move distribution according to velocity (streaming term)."""
-        num_velocities = f.shape[0]
-        grid_size = f.shape[1]
-        new_f = torch.zeros_like(f)
+    def _streaming_step(self, f, shifts):
+        """
+        Move distribution according to velocity (streaming term).
+        
+        Args:
+            f: Distribution function (grid_size, grid_size, num_velocities)
+            shifts: Integer (shift_x, shift_y) grid displacement per velocity direction
+        """
+        num_velocities = f.shape[-1]
+        new_f = torch.empty_like(f)
         
         for i in range(num_velocities):
-            vx, vy = self.velocities[i]
-            
-            # Scale velocities by time step
-            shift_x = int(round(vx * dt))
-            shift_y = int(round(vy * dt))
+            shift_x, shift_y = shifts[i]
             
             # Streaming step (shift distribution in velocity direction)
-            for y in range(grid_size):
-                for x in range(grid_size):
-                    new_x = x + shift_x
-                    new_y = y + shift_y
-                    
-                    # Check bounds
-                    if 0 <= new_x < grid_size and 0 <= new_y < grid_size:
-                        new_f[i, new_y, new_x] += f[i, y, x]
-                    # Otherwise, particles are lost (exit or boundary)
+            new_f[..., i] = torch.roll(f[..., i], shifts=(shift_y, shift_x), dims=(0, 1))
+            
+            # Particles shifted past the edge are lost (exit or boundary), not wrapped around
+            if shift_y > 0:
+                new_f[:shift_y, :, i] = 0
+            elif shift_y < 0:
+                new_f[shift_y:, :, i] = 0
+            if shift_x > 0:
+                new_f[:, :shift_x, i] = 0
+            elif shift_x < 0:
+                new_f[:, shift_x:, i] = 0
                     
         return new_f
     
-    def _add_hazard_influence(self, f, hazards, grid_size, dt):
-        """Add influence of hazards on the distribution function."""
-        if not hazards:
-            return f
-        
-        # Create hazard field
+    def _grid_coordinates(self, grid_size):
+        """Return (yy, xx) integer coordinate grids shared by the vectorized field constructions."""
+        return torch.meshgrid(
+            torch.arange(grid_size, device=self.device),
+            torch.arange(grid_size, device=self.device),
+            indexing='ij'
+        )
+    
+    def _build_hazard_field(self, hazards, grid_size):
+        """Rasterize hazard intensities into a field that decreases with distance from each hazard."""
         hazard_field = torch.zeros((grid_size, grid_size), device=self.device)
+        yy, xx = self._grid_coordinates(grid_size)
         
         # Fill in hazard field
         for hazard in hazards:
@@ -189,46 +356,44 @@ class BoltzmannModel:
             center_x = int(pos_x * grid_size / 20)
             center_y = int(pos_y * grid_size / 20)
             grid_radius = int(radius * grid_size / 20)
+            if grid_radius <= 0:
+                continue  # No cell is strictly inside a zero radius
             
-            # Add hazard influence
-            for y in range(grid_size):
-                for x in range(grid_size):
-                    dist_sq = (x - center_x)**2 + (y - center_y)**2
-                    if dist_sq < grid_radius**2:
-                        # Hazard intensity decreases with distance
-                        hazard_field[y, x] += intensity * (1.0 - np.sqrt(dist_sq) / grid_radius)
-        
-        # Calculate repulsion from hazards
-        # Particles move away from hazards
-        num_velocities = f.shape[0]
-        density = torch.sum(f, dim=0)
-        
-        # For each cell with hazard influence
-        mask = hazard_field > 0.01
-        if mask.sum() > 0:
-            hazard_grad_y, hazard_grad_x = torch.gradient(hazard_field)
+            # Add hazard influence over the whole grid at once
+            dist_sq = (xx - center_x)**2 + (yy - center_y)**2
             
-            # Redistribute particles to move away from hazard
-            for i in range(num_velocities):
-                vx, vy = self.velocities[i]
-                # Dot product of velocity with hazard gradient
-                # Positive dot product means velocity away from hazard
-                dot_product = -vx * hazard_grad_x - vy * hazard_grad_y
-                
-                # Increase probability in directions away from hazard
-                adjustment = torch.zeros_like(f[i])
-                adjustment[mask] = torch.clamp(dot_product[mask] * hazard_field[mask] * dt, 0, density[mask])
-                f[i] += adjustment
-        
-        return f
+            # Hazard intensity decreases with distance
+            influence = intensity * (1.0 - torch.sqrt(dist_sq.double()) / grid_radius)
+            hazard_field += torch.where(dist_sq < grid_radius**2, influence, 0.0).float()
+        
+        return hazard_field
     
-    def _calculate_exit_attraction(self, f, exits, grid_size):
-        """Calculate attraction forces toward exits."""
-        if not exits:
-            return f
+    def _build_hazard_drift(self, hazard_field, hazard_grad_x, hazard_grad_y, dt):
+        """
+        Precompute how much probability each velocity direction gains per step from hazard repulsion.
         
-        # Create potential field from exits
-        exit_potential = torch.zeros((grid_size, grid_size), device=self.device)
+        Returns:
+            Tensor (grid_size, grid_size, num_velocities), zero outside hazard areas
+        """
+        # Dot product of every velocity with the hazard gradient at once;
+        # positive means velocity away from hazard
+        dot_product = -torch.einsum('vd,dhw->hwv', self.velocities, torch.stack([hazard_grad_x, hazard_grad_y]))
+        
+        # Increase probability in directions away from hazard, in cells with hazard influence
+        hazard_field = hazard_field.unsqueeze(-1)
+        mask = hazard_field > 0.01
+        return torch.where(mask, torch.clamp(dot_product * hazard_field * dt, min=0), 0.0)
+    
+    def _add_hazard_influence(self, f, hazard_drift):
+        """Add influence of hazards on the distribution function."""
+        # Particles move away from hazards, by at most the local density per direction
+        density = torch.sum(f, dim=-1)
+        return f + torch.minimum(hazard_drift, density.unsqueeze(-1))
+    
+    def _build_exit_potential(self, exits, grid_size):
+        """Create a potential field that increases toward the nearest exit."""
+        exit_potential = torch.zeros((grid_size, grid_size), dtype=torch.float64, device=self.device)
+        yy, xx = self._grid_coordinates(grid_size)
         
         # Fill in exit potential field
         for exit_pos in exits:
@@ -237,35 +402,98 @@ class BoltzmannModel:
             exit_y = int(exit_pos[1] * grid_size / 20)
             
             # Create distance field from this exit
-            for y in range(grid_size):
-                for x in range(grid_size):
-                    dist = np.sqrt((x - exit_x)**2 + (y - exit_y)**2)
-                    # Attraction increases as agents get closer to exit
-                    attraction = np.exp(-dist / (grid_size/10))
-                    exit_potential[y, x] = max(exit_potential[y, x], attraction)
+            dist = torch.sqrt(((xx - exit_x)**2 + (yy - exit_y)**2).double())
+            # Attraction increases as agents get closer to exit
+            exit_potential = torch.maximum(exit_potential, torch.exp(-dist / (grid_size/10)))
+        
+        return exit_potential.float()
+    
+    def _build_exit_drift(self, exit_grad_x, exit_grad_y):
+        """
+        Precompute how much probability each velocity direction gains per step from exit attraction.
         
-        # Calculate gradients of exit potential
-        exit_grad_y, exit_grad_x = torch.gradient(exit_potential)
+        Returns:
+            Tensor (grid_size, grid_size, num_velocities)
+        """
+        # Dot product of every velocity with the exit gradient at once;
+        # positive means velocity toward exit
+        dot_product = torch.einsum('vd,dhw->hwv', self.velocities, torch.stack([exit_grad_x, exit_grad_y]))
         
+        # Increase probability in directions toward exit
+        return torch.where(dot_product > 0, dot_product * 0.1, 0.0)
+    
+    def _calculate_exit_attraction(self, f, exit_drift):
+        """Calculate attraction forces toward exits."""
         # Adjust distribution to move toward exits
-        num_velocities = f.shape[0]
-        density = torch.sum(f, dim=0)
+        return f + exit_drift
+    
+    def _step(self, f, wall_mask, hazard_drift, exit_drift, shifts, dt):
+        """
+        Advance the distribution function by one time step.
         
-        for i in range(num_velocities):
-            vx, vy = self.velocities[i]
-            # Dot product of velocity with exit gradient
-            # Positive dot product means velocity toward exit
-            dot_product = vx * exit_grad_x + vy * exit_grad_y
-            
-            # Increase probability in directions toward exit
-            mask = dot_product > 0
-            adjustment = torch.zeros_like(f[i])
-            adjustment[mask] = dot_product[mask] * 0.1
-            
-            # Normalize to maintain density
-            f[i] += adjustment
-            
-        return f
+        Pure tensor function over the precomputed wall mask and hazard/exit drifts, so the
+        whole step can be captured as one compiled graph.
+        
+        Returns:
+            Tuple of (updated distribution, density, velocity_x, velocity_y, total occupancy)
+            where the macroscopic fields describe the state at the start of the step
+        """
+        # Calculate macroscopic fields
+        density, velocity_x, velocity_y = self._compute_macroscopic_fields(f)
+        
+        # Calculate collision term
+        collision_term = self._collision_step(f, density)
+        
+        # Update distribution with collision effects
+        f = f + dt * collision_term
+        
+        # Add hazard influence
+        f = self._add_hazard_influence(f, hazard_drift)
+        
+        # Add exit attraction
+        f = self._calculate_exit_attraction(f, exit_drift)
+        
+        # Streaming step
+        f = self._streaming_step(f, shifts)
+        
+        # Apply boundary conditions again
+        f = self._apply_boundary_conditions(f, wall_mask)
+        
+        return f, density, velocity_x, velocity_y, torch.sum(density, dtype=torch.float32)
+    
+    def _step_numba(self, f, wall_mask, hazard_drift, exit_drift, shifts, dt):
+        """CPU variant of _step running the Numba kernel on zero-copy NumPy views."""
+        f_out = torch.empty_like(f)
+        density = f.new_empty(f.shape[:2])
+        velocity_x = f.new_empty(f.shape[:2])
+        velocity_y = f.new_empty(f.shape[:2])
+        _boltzmann_step_kernel(
+            f.numpy(), self.velocities.numpy(), wall_mask.numpy(), hazard_drift.numpy(), exit_drift.numpy(),
+            np.asarray(shifts, dtype=np.int64), dt, self.density_threshold,
+            f_out.numpy(), density.numpy(), velocity_x.numpy(), velocity_y.numpy()
+        )
+        return f_out, density, velocity_x, velocity_y, torch.sum(density, dtype=torch.float32)
+    
+    def _step_triton(self, f, wall_mask, hazard_drift, exit_drift, shifts, dt):
+        """GPU variant of _step launching the fused Triton kernel once per time step."""
+        grid_size, num_velocities = f.shape[0], f.shape[-1]
+        f_out = torch.zeros_like(f)
+        density = f.new_empty(f.shape[:2])
+        velocity_x = f.new_empty(f.shape[:2])
+        velocity_y = f.new_empty(f.shape[:2])
+        
+        # Same integer shifts as the shifts argument, computed on device to avoid a host copy
+        shift_table = torch.round(self.velocities * dt).to(torch.int32)
+        
+        block = 16
+        grid = (triton.cdiv(grid_size, block), triton.cdiv(grid_size, block))
+        _boltzmann_step_triton[grid](
+            f, self.velocities, shift_table, wall_mask.view(torch.uint8), hazard_drift, exit_drift,
+            f_out, density, velocity_x, velocity_y,
+            grid_size, dt, self.density_threshold,
+            NUM_VELOCITIES=num_velocities, BLOCK=block
+        )
+        return f_out, density, velocity_x, velocity_y, torch.sum(density, dtype=torch.float32)
     
     def simulate(self, grid_size=50, time_steps=100, building_layout=None, hazards=None):
         """
@@ -288,61 +516,102 @@ class BoltzmannModel:
         dt = 0.1  # Time step
         
         # Setup
+        self._select_device(grid_size)
         self.velocities = torch.zeros((8, 2), device=self.device)
         for i in range(8):
             angle = 2 * np.pi * i / 8
             self.velocities[i, 0] = np.cos(angle)
             self.velocities[i, 1] = np.sin(angle)
+        
+        # Contiguous copy of the velocity table in the storage precision, so the per-step
+        # momentum reduction does not convert or re-stride it every time
+        self._velocity_table = self.velocities.to(self.state_dtype).contiguous()
             
         # Initialize distribution function
         f, _ = self._initialize_distribution(grid_size, building_layout or {})
         
         # Extract exits from layout
+        building_layout = building_layout or {}
         exits = building_layout.get('exits', [])
         
-        # Setup tracking of density and flow over time
-        density_history = torch.zeros(time_steps, grid_size, grid_size, device=self.device)
-        velocity_x_history = torch.zeros(time_steps, grid_size, grid_size, device=self.device)
-        velocity_y_history = torch.zeros(time_steps, grid_size, grid_size, device=self.device)
+        # Setup tracking of density and flow over time. On GPU the histories live in pinned
+        # host memory and are filled by asynchronous copies on a side stream, so VRAM only
+        # holds the simulation state and the transfers overlap with the next step
+        pin_history = self.device.type == 'cuda'
+        copy_stream = torch.cuda.Stream() if pin_history else None
+        density_history = torch.empty(time_steps, grid_size, grid_size, dtype=self.state_dtype, pin_memory=pin_history)
+        velocity_x_history = torch.empty(time_steps, grid_size, grid_size, dtype=self.state_dtype, pin_memory=pin_history)
+        velocity_y_history = torch.empty(time_steps, grid_size, grid_size, dtype=self.state_dtype, pin_memory=pin_history)
         total_occupancy = torch.zeros(time_steps, device=self.device)
         
+        # Walls, hazards and exits are static, so their fields are built once up front
+        wall_mask = self._build_wall_mask(building_layout, grid_size)
+        hazard_field = self._build_hazard_field(hazards or [], grid_size)
+        hazard_grad_y, hazard_grad_x = self._gradient(hazard_field)
+        exit_potential = self._build_exit_potential(exits, grid_size)
+        exit_grad_y, exit_grad_x = self._gradient(exit_potential)
+        
+        # The hazard and exit adjustments per direction only depend on these static fields
+        hazard_drift = self._build_hazard_drift(hazard_field, hazard_grad_x, hazard_grad_y, dt)
+        exit_drift = self._build_exit_drift(exit_grad_x, exit_grad_y)
+        
+        # Evolve the distribution and its drifts in the storage precision
+        f = f.to(self.state_dtype)
+        hazard_drift = hazard_drift.to(self.state_dtype)
+        exit_drift = exit_drift.to(self.state_dtype)
+        
+        # Integer grid displacement of each velocity direction per time step
+        shifts = tuple(map(tuple, torch.round(self.velocities * dt).long().tolist()))
+        
         # Apply boundary conditions (walls)
-        f = self._apply_boundary_conditions(f, building_layout or {}, grid_size)
+        f = self._apply_boundary_conditions(f, wall_mask)
+        
+        # Small CPU grids run the Numba kernel and GPUs the fused Triton kernel; otherwise
+        # fuse the whole step into one graph (PyTorch < 2.0 has no torch.compile). The
+        # reduce-overhead step returns CUDA graph outputs that its next replay overwrites in
+        # place, so on GPU they are cloned before the side-stream copy reads them
+        clone_outputs = False
+        if NUMBA_AVAILABLE and self.device.type == 'cpu' and grid_size < NUMBA_MAX_GRID_SIZE:
+            step = self._step_numba
+        elif TRITON_AVAILABLE and self.device.type == 'cuda':
+            step = self._step_triton
+        elif self.use_compile and hasattr(torch, 'compile'):
+            step = torch.compile(self._step, mode='reduce-overhead', fullgraph=True)
+            clone_outputs = copy_stream is not None
+        else:
+            step = self._step
         
         # Main simulation loop
         for t in range(time_steps):
-            # Calculate macroscopic fields
-            density, velocity_x, velocity_y = self._compute_macroscopic_fields(f)
+            # The occupancy reduction is part of the step, so a compiled step fuses it
+            f, density, velocity_x, velocity_y, total_occupancy[t] = step(
+                f, wall_mask, hazard_drift, exit_drift, shifts, dt
+            )
             
             # Store current state
-            density_history[t] = density
-            velocity_x_history[t] = velocity_x
-            velocity_y_history[t] = velocity_y
-            total_occupancy[t] = torch.sum(density)
-            
-            # Calculate collision term
-            collision_term = self._collision_step(f, density)
-            
-            # Update distribution with collision effects
-            f = f + dt * collision_term
-            
-            # Add hazard influence
-            f = self._add_hazard_influence(f, hazards or [], grid_size, dt)
-            
-            # Add exit attraction
-            f = self._calculate_exit_attraction(f, exits, grid_size)
-            
-            # Streaming step
-            f = self._streaming_step(f, dt)
-            
-            # Apply boundary conditions again
-            f = self._apply_boundary_conditions(f, building_layout or {}, grid_size)
-        
-        # Convert results to CPU and numpy for serialization
+            if copy_stream is not None:
+                if clone_outputs:
+                    density, velocity_x, velocity_y = density.clone(), velocity_x.clone(), velocity_y.clone()
+                copy_stream.wait_stream(torch.cuda.current_stream())
+                with torch.cuda.stream(copy_stream):
+                    for history, field in ((density_history, density), (velocity_x_history, velocity_x),
+                                           (velocity_y_history, velocity_y)):
+                        history[t].copy_(field, non_blocking=True)
+                        field.record_stream(copy_stream)  # Keep the allocator from reusing it mid-copy
+            else:
+                density_history[t] = density
+                velocity_x_history[t] = velocity_x
+                velocity_y_history[t] = velocity_y
+        
+        # Wait for the outstanding history copies before handing the buffers to NumPy
+        if copy_stream is not None:
+            copy_stream.synchronize()
+        
+        # Convert results to numpy for serialization
         results = {
-            'density': density_history.cpu().numpy(),
-            'velocity_x': velocity_x_history.cpu().numpy(),
-            'velocity_y': velocity_y_history.cpu().numpy(),
+            'density': density_history.float().numpy(),
+            'velocity_x': velocity_x_history.float().numpy(),
+            'velocity_y': velocity_y_history.float().numpy(),
             'total_occupancy': total_occupancy.cpu().numpy(),
             'grid_size': grid_size,
             'time_steps': time_steps,
@@ -372,52 +641,45 @@ class BoltzmannModel:
         if not exit_positions:
             exit_positions = [(grid_size//2, grid_size//2)]
         
+        # Grid cell indices shared by the vectorized field constructions
+        ii, jj = np.meshgrid(np.arange(grid_size), np.arange(grid_size), indexing='ij')
+        
         # Initial density concentration in center
         center = grid_size // 2
         radius = grid_size // 4
-        for i in range(grid_size):
-            for j in range(grid_size):
-                dist = np.sqrt((i - center)**2 + (j - center)**2)
-                if dist < radius:
-                    density[0, i, j] = 1.0 * (1 - dist/radius)
-        
-        total_occupancy[0] = np.sum(density[0])
-        
-        # Evolve density over time (flowing toward exits)
-        for t in range(1, time_steps):
-            # Density decreases over time (evacuation)
-            decay_factor = 1.0 - (t / time_steps) * 0.8
-            density[t] = density[t-1] * decay_factor
-            
-            # Calculate velocity field (pointing toward exits)
-            for i in range(grid_size):
-                for j in range(grid_size):
-                    if density[t, i, j] > 0.01:  # Only for occupied cells
-                        # Find closest exit
-                        closest_exit = exit_positions[0]
-                        min_dist = float('inf')
-                        for ex, ey in exit_positions:
-                            dist = np.sqrt((i - ex)**2 + (j - ey)**2)
-                            if dist < min_dist:
-                                min_dist = dist
-                                closest_exit = (ex, ey)
-                        
-                        # Direction toward exit
-                        ex, ey = closest_exit
-                        dx = ex - i
-                        dy = ey - j
-                        dist = max(0.1, np.sqrt(dx*dx + dy*dy))
-                        velocity_x[t, i, j] = dx / dist
-                        velocity_y[t, i, j] = dy / dist
-            
-            # Track total occupancy
-            total_occupancy[t] = np.sum(density[t])
-        
+        dist = np.sqrt((ii - center)**2 + (jj - center)**2)
+        density[0] = np.where(dist < radius, 1.0 * (1 - dist/max(radius, 1)), 0.0)
+        
+        # Density decreases over time (evacuation) by a cumulative decay factor
+        decay_factor = 1.0 - (np.arange(time_steps) / time_steps) * 0.8
+        decay_factor[0] = 1.0
+        density[1:] = density[0] * np.cumprod(decay_factor)[1:, None, None]
+        
+        # Find closest exit of each cell (first exit wins ties); this does not change over time
+        exit_xs = np.array([ex for ex, _ in exit_positions])
+        exit_ys = np.array([ey for _, ey in exit_positions])
+        exit_dists = np.sqrt((ii - exit_xs[:, None, None])**2 + (jj - exit_ys[:, None, None])**2)
+        closest = np.argmin(exit_dists, axis=0)
+        
+        # Direction toward exit
+        dx = exit_xs[closest] - ii
+        dy = exit_ys[closest] - jj
+        dist = np.maximum(0.1, np.sqrt(dx*dx + dy*dy))
+        
+        # Velocity field pointing toward exits, only for occupied cells (from the second step)
+        occupied = density[1:] > 0.01
+        velocity_x[1:] = np.where(occupied, dx / dist, 0.0)
+        velocity_y[1:] = np.where(occupied, dy / dist, 0.0)
+        
+        # Track total occupancy
+        total_occupancy[:] = density.sum(axis=(1, 2))
+        
+        # Same array types as simulate(); the API's JSON handler serializes them directly
         return {
-            'density': density.tolist(),
-            'velocity_x': velocity_x.tolist(),
-            'velocity_y': velocity_y.tolist(),
-            'total_occupancy': total_occupancy.tolist(),
+            'density': density,
+            'velocity_x': velocity_x,
+            'velocity_y': velocity_y,
+            'total_occupancy': total_occupancy,
             'grid_size': grid_size,
             'time_steps': time_steps,
             'mock_data': True
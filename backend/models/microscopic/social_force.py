@@ -1,18 +1,393 @@
 import numpy as np
 import torch
 import logging
+import math
 import os
 
+try:
+    from numba import njit, prange
+    NUMBA_AVAILABLE = True
+except ImportError:  # Numba is optional; without it the mock kernel runs as plain Python
+    NUMBA_AVAILABLE = False
+    prange = range
+    def njit(*args, **kwargs):
+        return lambda fn: fn
+
+try:
+    from numba import cuda
+    NUMBA_CUDA_AVAILABLE = cuda.is_available()
+except ImportError:  # Without Numba CUDA, GPU runs use the compiled torch step
+    NUMBA_CUDA_AVAILABLE = False
+
 logger = logging.getLogger(__name__)
 
+# Crowds of at least this many agents on GPU run the Numba CUDA kernel, where per-op
+# dispatch of the torch step would dominate
+NUMBA_CUDA_MIN_AGENTS = 10000
+CUDA_THREADS_PER_BLOCK = 128
+
+@njit(parallel=True, cache=True)
+def _mock_kernel(positions, velocities, safe_agents, exits, desired_speed):
+    """
+    Agent loop of SocialForceModel._generate_mock_results.
+    
+    Agents are independent of each other, so each one is advanced through all time
+    steps in parallel; positions and velocities are filled in place.
+    """
+    time_steps, num_agents = positions.shape[0], positions.shape[1]
+    
+    for i in prange(num_agents):
+        for t in range(time_steps):
+            # Find closest exit
+            closest_exit = 0
+            min_dist = np.inf
+            for e in range(exits.shape[0]):
+                dist = np.sqrt((positions[t, i, 0] - exits[e, 0])**2 + (positions[t, i, 1] - exits[e, 1])**2)
+                if dist < min_dist:
+                    min_dist = dist
+                    closest_exit = e
+            
+            # Direction toward exit
+            dx = exits[closest_exit, 0] - positions[t, i, 0]
+            dy = exits[closest_exit, 1] - positions[t, i, 1]
+            dist = max(0.1, np.sqrt(dx*dx + dy*dy))
+            velocities[t, i, 0] = dx / dist * desired_speed
+            velocities[t, i, 1] = dy / dist * desired_speed
+            
+            # For next time step (if not the last)
+            if t < time_steps-1:
+                if safe_agents[t] > i:  # This agent has been evacuated
+                    positions[t+1, i, 0] = -1000.0  # Move far away
+                    positions[t+1, i, 1] = -1000.0
+                    velocities[t+1, i, 0] = 0.0  # No velocity
+                    velocities[t+1, i, 1] = 0.0
+                else:
+                    # Simple movement for next time step
+                    positions[t+1, i, 0] = positions[t, i, 0] + velocities[t, i, 0] * 0.1  # dt = 0.1s
+                    positions[t+1, i, 1] = positions[t, i, 1] + velocities[t, i, 1] * 0.1
+
+# Cell key of evacuated agents: sorts after every real cell and is never queried
+_EVACUATED_KEY = np.iinfo(np.int64).max
+
+@njit(fastmath=True, cache=True)
+def _sort_by_cell(positions, cutoff, evacuated):
+    """
+    Spatial hash of the (2, num_agents) positions with square cells the size of the cutoff.
+    
+    Evacuated agents get _EVACUATED_KEY, so neighbour searches never visit them.
+    
+    Returns:
+        Tuple of (cell_x, cell_y, order, sorted_keys): the cell of every agent, and the agent
+        indices sorted by cell key together with those keys
+    """
+    cell_x = np.floor(positions[0] / cutoff).astype(np.int64)
+    cell_y = np.floor(positions[1] / cutoff).astype(np.int64)
+    # The row offset keeps negative cell indices unique
+    keys = cell_x * (1 << 32) + (cell_y + (1 << 31))
+    keys[evacuated] = _EVACUATED_KEY
+    order = np.argsort(keys)
+    return cell_x, cell_y, order, keys[order]
+
+@njit(fastmath=True, cache=True)
+def _pairwise_repulsion(rel_x, rel_y, distance_sq, intensity, decay_length):
+    """
+    Exponential-decay repulsion along (rel_x, rel_y), the vector from a source to the agent.
+    
+    Shared by agent repulsion and hazard avoidance, which differ only in their intensity
+    and decay length.
+    """
+    distance = np.sqrt(distance_sq)
+    magnitude = intensity * np.exp(-distance / decay_length)
+    return rel_x / distance * magnitude, rel_y / distance * magnitude
+
+@njit(fastmath=True, cache=True)
+def _agent_repulsion_np(i, positions, cell_x, cell_y, order, sorted_keys, cutoff):
+    """
+    Unscaled repulsion on agent i from the agents within the cutoff.
+    
+    Only the agents in the agent's own and the eight surrounding cells are visited, which
+    costs O(k) for k neighbours instead of O(N).
+    """
+    n_agents = positions.shape[1]
+    force_x = 0.0
+    force_y = 0.0
+    for offset_x in range(-1, 2):
+        for offset_y in range(-1, 2):
+            key = (cell_x[i] + offset_x) * (1 << 32) + (cell_y[i] + offset_y + (1 << 31))
+            k = np.searchsorted(sorted_keys, key)
+            while k < n_agents and sorted_keys[k] == key:
+                j = order[k]
+                rel_x = positions[0, i] - positions[0, j]
+                rel_y = positions[1, i] - positions[1, j]
+                distance_sq = rel_x * rel_x + rel_y * rel_y
+                # Exclude self-interaction; the square root is only taken for agents in range
+                if distance_sq > 0 and distance_sq < cutoff * cutoff:
+                    pair_x, pair_y = _pairwise_repulsion(rel_x, rel_y, distance_sq, 2.0, 0.8)
+                    force_x += pair_x
+                    force_y += pair_y
+                k += 1
+    return force_x, force_y
+
+@njit(fastmath=True, cache=True)
+def _wall_repulsion_np(pos_x, pos_y, walls):
+    """Repulsion on one agent from the closest point of each wall segment within 1 meter."""
+    force_x = 0.0
+    force_y = 0.0
+    for w in range(walls.shape[0]):
+        start_x = walls[w, 0, 0]
+        start_y = walls[w, 0, 1]
+        wall_x = walls[w, 1, 0] - start_x
+        wall_y = walls[w, 1, 1] - start_y
+        wall_length = np.sqrt(wall_x * wall_x + wall_y * wall_y)
+        unit_x = wall_x / wall_length
+        unit_y = wall_y / wall_length
+        proj_length = min(max((pos_x - start_x) * unit_x + (pos_y - start_y) * unit_y, 0.0), wall_length)
+        rel_x = pos_x - (start_x + proj_length * unit_x)
+        rel_y = pos_y - (start_y + proj_length * unit_y)
+        distance_sq = rel_x * rel_x + rel_y * rel_y
+        if distance_sq < 1.0:
+            distance = np.sqrt(distance_sq)
+            magnitude = np.exp(-distance / 0.2) * 3.0
+            force_x += rel_x / (distance + 1e-6) * magnitude
+            force_y += rel_y / (distance + 1e-6) * magnitude
+    return force_x, force_y
+
+@njit(fastmath=True, cache=True)
+def _hazard_avoidance_np(pos_x, pos_y, hazard_positions, hazard_radii, hazard_intensities):
+    """Unscaled hazard avoidance on one agent from every hazard within radius * safety factor."""
+    force_x = 0.0
+    force_y = 0.0
+    for h in range(hazard_positions.shape[0]):
+        rel_x = pos_x - hazard_positions[h, 0]
+        rel_y = pos_y - hazard_positions[h, 1]
+        distance_sq = rel_x * rel_x + rel_y * rel_y
+        if distance_sq < (hazard_radii[h] * 2.0) ** 2:
+            pair_x, pair_y = _pairwise_repulsion(rel_x, rel_y, distance_sq, hazard_intensities[h] * 5.0, hazard_radii[h])
+            force_x += pair_x
+            force_y += pair_y
+    return force_x, force_y
+
+@njit(parallel=True, fastmath=True, cache=True)
+def _run_sfm(positions, velocities, agent_goals, walls, hazard_positions, hazard_radii, hazard_intensities,
+             goals, desired_speed, relaxation_time, panic_factor, max_speed, dt,
+             position_history, velocity_history, safe_agents):
+    """
+    CPU time loop of SocialForceModel.simulate, filling the histories in place.
+    
+    Agent state is coordinate-major (2, num_agents) float32. Every step hashes the agents
+    into cells once and then advances all agents in parallel from the previous state,
+    mirroring SocialForceModel._step. Agents that reached an exit are out of the
+    simulation: they stay parked far away with zero velocity and are neither hashed nor
+    advanced, so late in a run the step only costs as much as the agents still inside.
+    """
+    n_agents = positions.shape[1]
+    positions = positions.copy()
+    velocities = velocities.copy()
+    next_positions = np.empty_like(positions)
+    next_velocities = np.empty_like(velocities)
+    reached_exit = np.zeros(n_agents, dtype=np.int32)
+    evacuated = np.zeros(n_agents, dtype=np.bool_)
+    
+    for t in range(position_history.shape[0]):
+        cell_x, cell_y, order, sorted_keys = _sort_by_cell(positions, 2.0, evacuated)
+        
+        for i in prange(n_agents):
+            if evacuated[i]:
+                reached_exit[i] = 0
+                for d in range(2):
+                    position_history[t, d, i] = positions[d, i]
+                    velocity_history[t, d, i] = 0.0
+                    next_positions[d, i] = positions[d, i]
+                    next_velocities[d, i] = 0.0
+                continue
+            
+            pos_x = positions[0, i]
+            pos_y = positions[1, i]
+            vel_x = velocities[0, i]
+            vel_y = velocities[1, i]
+            
+            # Desired force toward the goal
+            dir_x = agent_goals[0, i] - pos_x
+            dir_y = agent_goals[1, i] - pos_y
+            # Safe divide: agents within 1 cm of their goal get a proportionally shorter direction
+            distance = max(np.sqrt(dir_x * dir_x + dir_y * dir_y), 0.01)
+            dir_x /= distance
+            dir_y /= distance
+            
+            # Total force
+            repulsion_x, repulsion_y = _agent_repulsion_np(i, positions, cell_x, cell_y, order, sorted_keys, 2.0)
+            wall_x, wall_y = _wall_repulsion_np(pos_x, pos_y, walls)
+            hazard_x, hazard_y = _hazard_avoidance_np(pos_x, pos_y, hazard_positions, hazard_radii, hazard_intensities)
+            force_x = (desired_speed * dir_x - vel_x) / relaxation_time + (repulsion_x + hazard_x) * panic_factor + wall_x
+            force_y = (desired_speed * dir_y - vel_y) / relaxation_time + (repulsion_y + hazard_y) * panic_factor + wall_y
+            
+            # Update velocities (unit mass), limit the speed and update positions
+            vel_x += force_x * dt
+            vel_y += force_y * dt
+            scale = min(max_speed / max(np.sqrt(vel_x * vel_x + vel_y * vel_y), 1e-12), 1.0)
+            vel_x *= scale
+            vel_y *= scale
+            pos_x += vel_x * dt
+            pos_y += vel_y * dt
+            
+            position_history[t, 0, i] = pos_x
+            position_history[t, 1, i] = pos_y
+            velocity_history[t, 0, i] = vel_x
+            velocity_history[t, 1, i] = vel_y
+            
+            # Remove agents who reached an exit (within 1m)
+            reached_exit[i] = 0
+            for e in range(goals.shape[0]):
+                exit_x = goals[e, 0] - pos_x
+                exit_y = goals[e, 1] - pos_y
+                if exit_x * exit_x + exit_y * exit_y < 1.0:
+                    reached_exit[i] = 1
+                    evacuated[i] = True
+                    pos_x = -1000.0
+                    pos_y = -1000.0
+                    vel_x = 0.0
+                    vel_y = 0.0
+                    break
+            
+            next_positions[0, i] = pos_x
+            next_positions[1, i] = pos_y
+            next_velocities[0, i] = vel_x
+            next_velocities[1, i] = vel_y
+        
+        safe_agents[t] = reached_exit.sum()
+        positions, next_positions = next_positions, positions
+        velocities, next_velocities = next_velocities, velocities
+
+if NUMBA_CUDA_AVAILABLE:
+    @cuda.jit(fastmath=True)
+    def _social_force_step_cuda(positions, velocities, agent_goals, walls, hazard_positions, hazard_radii,
+                                hazard_intensities, goals, desired_speed, relaxation_time, panic_factor,
+                                max_speed, dt, t, next_positions, next_velocities, position_history,
+                                velocity_history, safe_agents):
+        """
+        Fused GPU kernel for SocialForceModel._step, one thread per agent.
+        
+        Agent state is coordinate-major (2, num_agents), so neighbouring threads read
+        neighbouring addresses. Agent positions are staged through shared memory one
+        block-sized tile at a time for the pairwise repulsion. The recorded state goes straight into the histories and the
+        state for the next step into next_positions/next_velocities.
+        """
+        tile = cuda.shared.array((CUDA_THREADS_PER_BLOCK, 2), dtype=np.float32)
+        n_agents = positions.shape[1]
+        i = cuda.grid(1)
+        active = i < n_agents
+        
+        pos_x = positions[0, i] if active else 0.0
+        pos_y = positions[1, i] if active else 0.0
+        
+        # Repulsion between agents; every thread helps load each tile, even past the last agent
+        repulsion_x = 0.0
+        repulsion_y = 0.0
+        for tile_start in range(0, n_agents, CUDA_THREADS_PER_BLOCK):
+            j = tile_start + cuda.threadIdx.x
+            if j < n_agents:
+                tile[cuda.threadIdx.x, 0] = positions[0, j]
+                tile[cuda.threadIdx.x, 1] = positions[1, j]
+            cuda.syncthreads()
+            for k in range(min(CUDA_THREADS_PER_BLOCK, n_agents - tile_start)):
+                rel_x = tile[k, 0] - pos_x
+                rel_y = tile[k, 1] - pos_y
+                distance_sq = rel_x * rel_x + rel_y * rel_y
+                # Exclude self-interaction; the square root is only taken for agents in range
+                if distance_sq > 0 and distance_sq < 4.0:
+                    distance = math.sqrt(distance_sq)
+                    magnitude = math.exp(-distance / 0.8) * 2.0
+                    repulsion_x -= rel_x / distance * magnitude
+                    repulsion_y -= rel_y / distance * magnitude
+            cuda.syncthreads()
+        
+        if not active:
+            return
+        
+        vel_x = velocities[0, i]
+        vel_y = velocities[1, i]
+        
+        # Desired force toward the goal
+        dir_x = agent_goals[0, i] - pos_x
+        dir_y = agent_goals[1, i] - pos_y
+        # Safe divide: agents within 1 cm of their goal get a proportionally shorter direction
+        distance = max(math.sqrt(dir_x * dir_x + dir_y * dir_y), 0.01)
+        dir_x /= distance
+        dir_y /= distance
+        force_x = (desired_speed * dir_x - vel_x) / relaxation_time + repulsion_x * panic_factor
+        force_y = (desired_speed * dir_y - vel_y) / relaxation_time + repulsion_y * panic_factor
+        
+        # Wall repulsion from the closest point of each wall segment within 1 meter
+        for w in range(walls.shape[0]):
+            start_x = walls[w, 0, 0]
+            start_y = walls[w, 0, 1]
+            wall_x = walls[w, 1, 0] - start_x
+            wall_y = walls[w, 1, 1] - start_y
+            wall_length = math.sqrt(wall_x * wall_x + wall_y * wall_y)
+            unit_x = wall_x / wall_length
+            unit_y = wall_y / wall_length
+            proj_length = min(max((pos_x - start_x) * unit_x + (pos_y - start_y) * unit_y, 0.0), wall_length)
+            rel_x = pos_x - (start_x + proj_length * unit_x)
+            rel_y = pos_y - (start_y + proj_length * unit_y)
+            distance_sq = rel_x * rel_x + rel_y * rel_y
+            if distance_sq < 1.0:
+                distance = math.sqrt(distance_sq)
+                magnitude = math.exp(-distance / 0.2) * 3.0
+                force_x += rel_x / (distance + 1e-6) * magnitude
+                force_y += rel_y / (distance + 1e-6) * magnitude
+        
+        # Hazard avoidance within radius * safety factor
+        for h in range(hazard_positions.shape[0]):
+            rel_x = pos_x - hazard_positions[h, 0]
+            rel_y = pos_y - hazard_positions[h, 1]
+            distance_sq = rel_x * rel_x + rel_y * rel_y
+            if distance_sq < (hazard_radii[h] * 2.0) ** 2:
+                distance = math.sqrt(distance_sq)
+                magnitude = hazard_intensities[h] * math.exp(-(distance / hazard_radii[h])) * 5.0 * panic_factor
+                force_x += rel_x / distance * magnitude
+                force_y += rel_y / distance * magnitude
+        
+        # Update velocities (unit mass), limit the speed and update positions
+        vel_x += force_x * dt
+        vel_y += force_y * dt
+        scale = min(max_speed / max(math.sqrt(vel_x * vel_x + vel_y * vel_y), 1e-12), 1.0)
+        vel_x *= scale
+        vel_y *= scale
+        pos_x += vel_x * dt
+        pos_y += vel_y * dt
+        
+        position_history[t, 0, i] = pos_x
+        position_history[t, 1, i] = pos_y
+        velocity_history[t, 0, i] = vel_x
+        velocity_history[t, 1, i] = vel_y
+        
+        # Remove agents who reached an exit (within 1m)
+        for e in range(goals.shape[0]):
+            exit_x = goals[e, 0] - pos_x
+            exit_y = goals[e, 1] - pos_y
+            if exit_x * exit_x + exit_y * exit_y < 1.0:
+                cuda.atomic.add(safe_agents, t, 1)
+                pos_x = -1000.0
+                pos_y = -1000.0
+                vel_x = 0.0
+                vel_y = 0.0
+                break
+        
+        next_positions[0, i] = pos_x
+        next_positions[1, i] = pos_y
+        next_velocities[0, i] = vel_x
+        next_velocities[1, i] = vel_y
+
 class SocialForceModel:
     """
     Implementation of the Social Force Model with panic calibration.
     Based on Helbing's Social Force Model with panic factor α_panic = 1.2.
     """
     
-    def __init__(self, use_gpu=True):
+    def __init__(self, use_gpu=True, use_compile=True):
         self.device = torch.device("cuda" if torch.cuda.is_available() and use_gpu else "cpu")
+        self.use_compile = use_compile  # Fuse each time step with torch.compile when available
+        self._compiled_step = None  # Built on first use by _get_compiled_step
         self.panic_factor = 1.2  # α_panic from the research
         self.relaxation_time = 0.5  # τ parameter
         self.desired_speed = 1.4  # v0 parameter (m/s)
@@ -21,102 +396,188 @@ class SocialForceModel:
     def _calculate_desired_force(self, positions, velocities, goals):
         """Calculate the force driving agents toward their goals."""
         directions = goals - positions
-        distances = torch.norm(directions, dim=1, keepdim=True)
-        # Avoid division by zero
-        mask = distances > 0.01
-        normalized_directions = torch.zeros_like(directions)
-        normalized_directions[mask.squeeze()] = directions[mask.squeeze()] / distances[mask]
+        distances = torch.norm(directions, dim=0, keepdim=True)
+        # Avoid division by zero with a branchless safe divide; within 1 cm of the goal the
+        # direction simply shrinks toward zero
+        normalized_directions = directions / distances.clamp_min(0.01)
         
         desired_velocities = self.desired_speed * normalized_directions
         return (1/self.relaxation_time) * (desired_velocities - velocities)
     
-    def _calculate_agent_repulsion(self, positions, velocities):
-        """Calculate repulsive forces between agents."""
-        n_agents = positions.shape[0]
-        all_forces = torch.zeros((n_agents, 2), device=self.device)
-        
-        for i in range(n_agents):
-            rel_positions = positions - positions[i]
-            distances = torch.norm(rel_positions, dim=1)
-            # Exclude self-interaction
-            mask = (distances > 0) & (distances < 2.0)
-            
-            if mask.sum() > 0:
-                # Unit vectors pointing away from agent i
-                direction = rel_positions[mask] / distances[mask].unsqueeze(1)
-                # Force magnitude decreases with distance
-                magnitude = torch.exp(-distances[mask] / 0.8) * 2.0
-                force = direction * magnitude.unsqueeze(1)
-                all_forces[i] = -torch.sum(force, dim=0)
+    def _calculate_agent_repulsion(self, positions, velocities, panic_factor):
+        """Calculate repulsive forces between agents, scaled by panic_factor."""
+        # Relative position of every agent j as seen from every agent i, shape (2, N, N)
+        rel_positions = positions.unsqueeze(1) - positions.unsqueeze(2)
+        # Cull on squared distances (2 m cutoff); pairs outside get a dummy distance of 1
+        distances_sq = torch.sum(rel_positions * rel_positions, dim=0)
+        # Exclude self-interaction
+        mask = (distances_sq > 0) & (distances_sq < 4.0)
+        distances = torch.where(mask, distances_sq.sqrt(), 1.0)
         
-        return all_forces * self.panic_factor  # Apply panic factor
+        # Unit vectors from agent i toward each neighbour j
+        direction = rel_positions / distances
+        # Force magnitude decreases with distance; pairs outside the mask contribute nothing
+        magnitude = torch.exp(-distances / 0.8) * 2.0
+        all_forces = -torch.einsum('dnm,nm->dn', direction, torch.where(mask, magnitude, 0.0))
+        
+        return all_forces * panic_factor  # Apply panic factor
         
     def _calculate_wall_repulsion(self, positions, walls):
-        """Calculate repulsive forces from walls."""
-        n_agents = positions.shape[0]
-        all_forces = torch.zeros((n_agents, 2), device=self.device)
+        """
+        Calculate repulsive forces from walls.
         
-        for wall in walls:
-            # Wall is defined by two points (x1,y1) and (x2,y2)
-            start, end = torch.tensor(wall[0], device=self.device), torch.tensor(wall[1], device=self.device)
-            
-            wall_vector = end - start
-            wall_length = torch.norm(wall_vector)
-            wall_unit = wall_vector / wall_length
-            
-            # Calculate perpendicular distance to wall for each agent
-            for i in range(n_agents):
-                agent_pos = positions[i]
-                agent_to_start = agent_pos - start
-                
-                # Project agent position onto wall line
-                proj_length = torch.dot(agent_to_start, wall_unit)
-                
-                # Clamp projection to wall segment
-                proj_length = torch.clamp(proj_length, 0, wall_length)
-                
-                # Closest point on wall to agent
-                closest_point = start + proj_length * wall_unit
-                
-                # Distance and direction from wall to agent
-                direction = agent_pos - closest_point
-                distance = torch.norm(direction)
-                
-                if distance < 1.0:  # Only consider walls within 1 meter
-                    # Normalize direction and calculate force (stronger when closer)
-                    norm_direction = direction / (distance + 1e-6)
-                    force_magnitude = torch.exp(-distance / 0.2) * 3.0
-                    all_forces[i] += norm_direction * force_magnitude
-        
-        return all_forces
-        
-    def _calculate_hazard_avoidance(self, positions, hazards):
-        """Calculate forces to avoid hazards (fire, water, etc.)."""
-        n_agents = positions.shape[0]
-        all_forces = torch.zeros((n_agents, 2), device=self.device)
-        
-        for hazard in hazards:
-            hazard_pos = torch.tensor(hazard['position'], device=self.device)
-            hazard_radius = hazard.get('radius', 2.0)
-            hazard_intensity = hazard.get('intensity', 1.0)
-            
-            # Vector from hazard to each agent
-            rel_positions = positions - hazard_pos
-            distances = torch.norm(rel_positions, dim=1)
-            
-            # Only affect agents within hazard radius * safety factor
-            safety_factor = 2.0
-            mask = distances < hazard_radius * safety_factor
-            
-            if mask.sum() > 0:
-                # Direction away from hazard
-                direction = rel_positions[mask] / distances[mask].unsqueeze(1)
-                # Force increases as agents get closer to hazard
-                magnitude = hazard_intensity * torch.exp(-(distances[mask] / hazard_radius)) * 5.0
-                force = direction * magnitude.unsqueeze(1)
-                all_forces[mask] += force
-        
-        return all_forces * self.panic_factor  # Panic affects hazard avoidance
+        Args:
+            positions: Agent positions (2, num_agents)
+            walls: Wall segments as a (num_walls, 2, 2) tensor of start and end points
+        """
+        # Wall is defined by two points (x1,y1) and (x2,y2); coordinates first, shape (2, 1, W)
+        start, end = walls[:, 0].T.unsqueeze(1), walls[:, 1].T.unsqueeze(1)
+        wall_vector = end - start
+        wall_length = torch.linalg.norm(wall_vector, dim=0)
+        wall_unit = wall_vector / wall_length
+        
+        # Project every agent position onto every wall line, shape (N, W)
+        agent_to_start = positions.unsqueeze(2) - start
+        proj_length = torch.einsum('dnw,dw->nw', agent_to_start, wall_unit[:, 0])
+        
+        # Clamp projection to wall segment
+        proj_length = torch.minimum(proj_length.clamp_min(0), wall_length)
+        
+        # Closest point on each wall to each agent
+        closest_point = start + proj_length * wall_unit
+        
+        # Distance and direction from wall to agent
+        direction = positions.unsqueeze(2) - closest_point
+        distance_sq = torch.sum(direction * direction, dim=0)
+        
+        # Only consider walls within 1 meter; normalize direction and calculate force (stronger when closer)
+        mask = distance_sq < 1.0
+        distance = torch.where(mask, distance_sq.sqrt(), 1.0)
+        norm_direction = direction / (distance + 1e-6)
+        force_magnitude = torch.exp(-distance / 0.2) * 3.0
+        
+        return torch.einsum('dnw,nw->dn', norm_direction, torch.where(mask, force_magnitude, 0.0))
+        
+    def _calculate_hazard_avoidance(self, positions, hazard_positions, hazard_radii, hazard_intensities, panic_factor):
+        """
+        Calculate forces to avoid hazards (fire, water, etc.).
+        
+        Args:
+            positions: Agent positions (2, num_agents)
+            hazard_positions: Hazard centres (num_hazards, 2)
+            hazard_radii: Hazard radii (num_hazards,)
+            hazard_intensities: Hazard intensities (num_hazards,)
+            panic_factor: Panic factor scaling the avoidance
+        """
+        # Vector from each hazard to each agent, shape (2, N, H)
+        rel_positions = positions.unsqueeze(2) - hazard_positions.T.unsqueeze(1)
+        distances_sq = torch.sum(rel_positions * rel_positions, dim=0)
+        
+        # Only affect agents within hazard radius * safety factor, compared squared
+        safety_factor = 2.0
+        mask = distances_sq < (hazard_radii * safety_factor) ** 2
+        distances = torch.where(mask, distances_sq.sqrt(), 1.0)
+        
+        # Direction away from hazard
+        direction = rel_positions / distances
+        # Force increases as agents get closer to hazard
+        magnitude = hazard_intensities * torch.exp(-(distances / hazard_radii)) * 5.0
+        all_forces = torch.einsum('dnh,nh->dn', direction, torch.where(mask, magnitude, 0.0))
+        
+        return all_forces * panic_factor  # Panic affects hazard avoidance
+    
+    def _step(self, positions, velocities, agent_goals, walls, hazard_positions, hazard_radii,
+              hazard_intensities, goals, panic_factor, max_speed, dt):
+        """
+        Advance all agents by one time step.
+        
+        Agent state is coordinate-major: positions, velocities and goals are (2, num_agents)
+        tensors whose x and y rows are each contiguous. Pure tensor function over the
+        precomputed goal, wall, hazard and exit tensors with no data-dependent branches, so
+        the whole step can be captured as one compiled graph without host syncs. The
+        per-simulation panic_factor and max_speed arrive as 0-d tensors rather than being
+        read from the model, so a new panic factor reuses the compiled graph.
+        
+        Returns:
+            Tuple of (positions, velocities, number of agents that reached an exit, next positions,
+            next velocities) where the first two are recorded before agents that reached an exit
+            are removed, and the last two carry over to the next step
+        """
+        # Calculate forces
+        desired_force = self._calculate_desired_force(positions, velocities, agent_goals)
+        agent_repulsion = self._calculate_agent_repulsion(positions, velocities, panic_factor)
+        wall_repulsion = self._calculate_wall_repulsion(positions, walls)
+        hazard_avoidance = self._calculate_hazard_avoidance(positions, hazard_positions, hazard_radii,
+                                                            hazard_intensities, panic_factor)
+        
+        # Total force
+        total_force = desired_force + agent_repulsion + wall_repulsion + hazard_avoidance
+        
+        # Update velocities (F = ma, assuming unit mass)
+        velocities = velocities + total_force * dt
+        
+        # Limit maximum velocity based on panic factor (max_speed)
+        # Branchless: agents below the limit get a scale of exactly 1
+        speeds = torch.norm(velocities, dim=0, keepdim=True).clamp_min(1e-12)
+        velocities = velocities * (max_speed / speeds).clamp_max(1.0)
+        
+        # Update positions
+        positions = positions + velocities * dt
+        
+        # Check for agents who reached any exit (within 1m), against all exits at once
+        # Only a comparison is needed, so the (N, E) matrix holds squared distances
+        exit_distances_sq = torch.sum((positions.unsqueeze(2) - goals.T.unsqueeze(1))**2, dim=0)
+        reached_exit = torch.amin(exit_distances_sq, dim=1) < 1.0
+        
+        # Remove agents who reached exits: move them far away and zero their velocity
+        next_positions = torch.where(reached_exit, -1000.0, positions)
+        next_velocities = torch.where(reached_exit, 0.0, velocities)
+        
+        return positions, velocities, reached_exit.sum(), next_positions, next_velocities
+    
+    def _get_compiled_step(self):
+        """
+        Return the compiled step, compiling it on first use.
+        
+        The compiled function is kept on the model so later simulations reuse it. It is
+        static-shape: Dynamo compiles (and caches, up to its cache_size_limit) one graph per
+        (num_agents, num_walls, num_hazards) it sees, so repeated runs of the same scenario
+        skip recompilation. Scalars that vary per request are tensor inputs, not guards.
+        """
+        if self._compiled_step is None:
+            self._compiled_step = torch.compile(self._step, mode='reduce-overhead', dynamic=False, fullgraph=True)
+        return self._compiled_step
+    
+    def _simulate_cuda(self, positions, velocities, agent_goals, walls, hazard_positions, hazard_radii,
+                       hazard_intensities, goals, dt, position_history, velocity_history, safe_agents):
+        """
+        Run the time loop with the Numba CUDA kernel, filling the history tensors in place.
+        
+        The torch tensors are shared with Numba zero-copy, and the agent state stays on the
+        device between steps in two ping-pong buffers. The kernel records into device-side
+        histories, which are copied into the (pinned host) history tensors once at the end.
+        """
+        max_speed = self.desired_speed * (1 + 0.5 * self.panic_factor)
+        blocks = (positions.shape[1] + CUDA_THREADS_PER_BLOCK - 1) // CUDA_THREADS_PER_BLOCK
+        
+        state = [cuda.as_cuda_array(positions.contiguous()), cuda.as_cuda_array(velocities.contiguous())]
+        next_state = [cuda.as_cuda_array(torch.empty_like(positions)), cuda.as_cuda_array(torch.empty_like(velocities))]
+        static = [cuda.as_cuda_array(tensor.contiguous()) for tensor in
+                  (agent_goals, walls, hazard_positions, hazard_radii, hazard_intensities, goals)]
+        device_histories = [torch.empty_like(position_history, device=self.device),
+                            torch.empty_like(velocity_history, device=self.device)]
+        histories = [cuda.as_cuda_array(tensor) for tensor in (*device_histories, safe_agents)]
+        
+        for t in range(position_history.shape[0]):
+            _social_force_step_cuda[blocks, CUDA_THREADS_PER_BLOCK](
+                *state, *static, self.desired_speed, self.relaxation_time, self.panic_factor,
+                max_speed, dt, t, *next_state, *histories
+            )
+            state, next_state = next_state, state
+        cuda.synchronize()
+        
+        position_history.copy_(device_histories[0])
+        velocity_history.copy_(device_histories[1])
     
     def simulate(self, num_agents=100, time_steps=100, building_layout=None, hazards=None, panic_factor=None):
         """
@@ -140,75 +601,100 @@ class SocialForceModel:
             logger.info("Using mock microscopic simulation results")
             return self._generate_mock_results(num_agents, time_steps, building_layout, hazards)
         
-        # Set up walls from building layout
-        walls = building_layout.get('walls', [])
+        # Set up walls from building layout as one (num_walls, 2, 2) tensor of segment end points
+        walls = torch.as_tensor(building_layout.get('walls', []), dtype=torch.float32, device=self.device).reshape(-1, 2, 2)
+        # Zero-length walls have no direction and never repel, so drop them up front
+        walls = walls[torch.any(walls[:, 0] != walls[:, 1], dim=1)]
         exits = building_layout.get('exits', [])
         
-        # Initialize agents
-        positions = torch.rand(num_agents, 2, device=self.device) * 20  # Random positions in 20x20 space
-        velocities = torch.zeros(num_agents, 2, device=self.device)
+        # Hazard properties as tensors, converted once rather than every step
+        hazards = hazards or []
+        hazard_positions = torch.tensor([hazard['position'] for hazard in hazards], dtype=torch.float32, device=self.device).reshape(-1, 2)
+        hazard_radii = torch.tensor([hazard.get('radius', 2.0) for hazard in hazards], dtype=torch.float32, device=self.device)
+        hazard_intensities = torch.tensor([hazard.get('intensity', 1.0) for hazard in hazards], dtype=torch.float32, device=self.device)
         
-        # Assign goals (nearest exit for each agent)
-        goals = torch.tensor(exits, device=self.device)
-        agent_goals = torch.zeros(num_agents, 2, device=self.device)
+        # Initialize agents. State is kept coordinate-major, (2, num_agents), so the x and y
+        # components are each contiguous
+        positions = (torch.rand(num_agents, 2, dtype=torch.float32, device=self.device) * 20).T.contiguous()  # Random positions in 20x20 space
+        velocities = torch.zeros(2, num_agents, dtype=torch.float32, device=self.device)
         
-        for i in range(num_agents):
-            distances = torch.norm(goals - positions[i].unsqueeze(0), dim=1)
-            closest_exit = torch.argmin(distances)
-            agent_goals[i] = goals[closest_exit]
+        # Assign goals (nearest exit for each agent)
+        goals = torch.tensor(exits, dtype=torch.float32, device=self.device)
+        # Exact (non-matmul) distances keep ties between equidistant exits deterministic
+        distances = torch.cdist(positions.T, goals, compute_mode='donot_use_mm_for_euclid_dist')
+        agent_goals = goals[torch.argmin(distances, dim=1)].T.contiguous()
         
-        # Setup tracking of agent positions over time
-        position_history = torch.zeros(time_steps, num_agents, 2, device=self.device)
-        velocity_history = torch.zeros(time_steps, num_agents, 2, device=self.device)
+        # Setup tracking of agent positions over time. On GPU the histories live in pinned
+        # host memory and are filled by asynchronous copies on a side stream, so VRAM only
+        # holds the simulation state and the transfers overlap with the next step
+        pin_history = self.device.type == 'cuda'
+        copy_stream = torch.cuda.Stream() if pin_history else None
+        position_history = torch.empty(time_steps, 2, num_agents, dtype=torch.float32, pin_memory=pin_history)
+        velocity_history = torch.empty(time_steps, 2, num_agents, dtype=torch.float32, pin_memory=pin_history)
         safe_agents = torch.zeros(time_steps, dtype=torch.int, device=self.device)
         
         # Time step (seconds)
         dt = 0.1
         
-        # Main simulation loop
-        for t in range(time_steps):
-            # Calculate forces
-            desired_force = self._calculate_desired_force(positions, velocities, agent_goals)
-            agent_repulsion = self._calculate_agent_repulsion(positions, velocities)
-            wall_repulsion = self._calculate_wall_repulsion(positions, walls)
-            hazard_avoidance = self._calculate_hazard_avoidance(positions, hazards or [])
-            
-            # Total force
-            total_force = desired_force + agent_repulsion + wall_repulsion + hazard_avoidance
-            
-            # Update velocities (F = ma, assuming unit mass)
-            velocities += total_force * dt
-            
-            # Limit maximum velocity based on panic factor
+        # Large crowds on GPU run the Numba CUDA kernel and CPUs the Numba time loop, both of
+        # which fill the histories themselves
+        if NUMBA_CUDA_AVAILABLE and self.device.type == 'cuda' and num_agents >= NUMBA_CUDA_MIN_AGENTS:
+            self._simulate_cuda(
+                positions, velocities, agent_goals, walls, hazard_positions, hazard_radii, hazard_intensities,
+                goals, dt, position_history, velocity_history, safe_agents
+            )
+        elif NUMBA_AVAILABLE and self.device.type == 'cpu':
             max_speed = self.desired_speed * (1 + 0.5 * self.panic_factor)
-            speeds = torch.norm(velocities, dim=1, keepdim=True)
-            mask = speeds > max_speed
-            velocities[mask.squeeze()] = velocities[mask.squeeze()] * max_speed / speeds[mask]
-            
-            # Update positions
-            positions += velocities * dt
+            _run_sfm(
+                positions.numpy(), velocities.numpy(), agent_goals.numpy(), walls.numpy(), hazard_positions.numpy(),
+                hazard_radii.numpy(), hazard_intensities.numpy(), goals.numpy(), self.desired_speed,
+                self.relaxation_time, self.panic_factor, max_speed, dt,
+                position_history.numpy(), velocity_history.numpy(), safe_agents.numpy()
+            )
+        else:
+            # Fuse the whole step into one graph (PyTorch < 2.0 has no torch.compile)
+            # The reduce-overhead step returns CUDA graph outputs that its next replay overwrites
+            # in place, so they are cloned before the side-stream copy reads them
+            if self.use_compile and hasattr(torch, 'compile'):
+                step = self._get_compiled_step()
+                clone_outputs = copy_stream is not None
+            else:
+                step = self._step
+                clone_outputs = False
             
-            # Record positions and velocities
-            position_history[t] = positions
-            velocity_history[t] = velocities
+            # Panic-dependent scalars as tensors, so the compiled step does not guard on them
+            panic_factor = torch.tensor(self.panic_factor, dtype=torch.float32, device=self.device)
+            max_speed = torch.tensor(self.desired_speed * (1 + 0.5 * self.panic_factor), dtype=torch.float32, device=self.device)
             
-            # Check for agents who reached exits
-            for i, exit_pos in enumerate(exits):
-                exit_pos_tensor = torch.tensor(exit_pos, device=self.device)
-                distances = torch.norm(positions - exit_pos_tensor, dim=1)
-                reached_exit = distances < 1.0  # Within 1m of exit
-                safe_agents[t] += reached_exit.sum().item()
+            # Main simulation loop
+            for t in range(time_steps):
+                recorded_positions, recorded_velocities, safe_agents[t], positions, velocities = step(
+                    positions, velocities, agent_goals, walls, hazard_positions, hazard_radii, hazard_intensities, goals,
+                    panic_factor, max_speed, dt
+                )
                 
-                # Remove agents who reached exits
-                if reached_exit.any():
-                    # Move them far away and zero their velocity
-                    positions[reached_exit] = torch.tensor([-1000, -1000], device=self.device)
-                    velocities[reached_exit] = 0
+                # Record positions and velocities
+                if copy_stream is not None:
+                    if clone_outputs:
+                        recorded_positions, recorded_velocities = recorded_positions.clone(), recorded_velocities.clone()
+                    copy_stream.wait_stream(torch.cuda.current_stream())
+                    with torch.cuda.stream(copy_stream):
+                        for history, field in ((position_history, recorded_positions),
+                                               (velocity_history, recorded_velocities)):
+                            history[t].copy_(field, non_blocking=True)
+                            field.record_stream(copy_stream)  # Keep the allocator from reusing it mid-copy
+                else:
+                    position_history[t] = recorded_positions
+                    velocity_history[t] = recorded_velocities
         
-        # Convert results to CPU and numpy for serialization
+        # Wait for the outstanding history copies before handing the buffers to NumPy
+        if copy_stream is not None:
+            copy_stream.synchronize()
+        
+        # Convert results to CPU and numpy for serialization, back in (time, agent, coordinate) order
         results = {
-            'positions': position_history.cpu().numpy(),
-            'velocities': velocity_history.cpu().numpy(),
+            'positions': position_history.transpose(1, 2).contiguous().numpy(),
+            'velocities': velocity_history.transpose(1, 2).contiguous().numpy(),
             'safe_agents': safe_agents.cpu().numpy(),
             'panic_factor': self.panic_factor,
             'time_steps': time_steps,
@@ -221,52 +707,27 @@ class SocialForceModel:
         """Generate mock simulation results for quick testing."""
         logger.info(f"Generating mock results for {num_agents} agents over {time_steps} time steps")
         
-        # Generate random agent positions (20x20 grid)
-        positions = np.random.rand(time_steps, num_agents, 2) * 20
-        velocities = np.zeros((time_steps, num_agents, 2))
+        # Generate random agent positions (20x20 grid); FP32 is ample for meter-scale positions
+        # and halves the memory traffic of the (time, agent, 2) arrays
+        positions = (np.random.rand(time_steps, num_agents, 2) * 20).astype(np.float32)
+        velocities = np.zeros((time_steps, num_agents, 2), dtype=np.float32)
         safe_agents = np.zeros(time_steps, dtype=int)
         
         # Get exits from building layout
         exits = building_layout.get('exits', [[10, 10]])
         
+        # More agents evacuate over time, following a quadratic evacuation curve
+        evacuation_rate = np.arange(time_steps) / time_steps
+        safe_agents[:] = num_agents * (evacuation_rate ** 2) * 0.9
+        
         # Set velocities pointing toward exits and handle evacuation dynamics
-        for t in range(time_steps):
-            # More agents evacuate over time
-            evacuation_rate = t / time_steps
-            safe_agents[t] = int(num_agents * (evacuation_rate ** 2) * 0.9)  # Quadratic evacuation curve
-            
-            # Agents move toward exits
-            for i in range(num_agents):
-                # Find closest exit
-                closest_exit = exits[0]
-                min_dist = float('inf')
-                for exit_pos in exits:
-                    dist = np.sqrt((positions[t,i,0] - exit_pos[0])**2 + (positions[t,i,1] - exit_pos[1])**2)
-                    if dist < min_dist:
-                        min_dist = dist
-                        closest_exit = exit_pos
-                
-                # Direction toward exit
-                dx = closest_exit[0] - positions[t,i,0]
-                dy = closest_exit[1] - positions[t,i,1]
-                dist = max(0.1, np.sqrt(dx*dx + dy*dy))
-                velocities[t,i,0] = dx / dist * self.desired_speed
-                velocities[t,i,1] = dy / dist * self.desired_speed
-                
-                # For next time step (if not the last)
-                if t < time_steps-1:
-                    if safe_agents[t] > i:  # This agent has been evacuated
-                        positions[t+1,i] = np.array([-1000, -1000])  # Move far away
-                        velocities[t+1,i] = np.array([0, 0])  # No velocity
-                    else:
-                        # Simple movement for next time step
-                        positions[t+1,i] = positions[t,i] + velocities[t,i] * 0.1  # dt = 0.1s
-        
-        # Return results in expected format
+        _mock_kernel(positions, velocities, safe_agents, np.asarray(exits, dtype=np.float32), self.desired_speed)
+        
+        # Return results in expected format; arrays are serialized directly by the API's JSON handler
         return {
-            'positions': positions.tolist(),
-            'velocities': velocities.tolist(),
-            'safe_agents': safe_agents.tolist(),
+            'positions': positions,
+            'velocities': velocities,
+            'safe_agents': safe_agents,
             'panic_factor': self.panic_factor,
             'time_steps': time_steps,
             'dt': 0.1,
@@ -1,15 +1,99 @@
+import os
+
+# Keep Inductor's compiled kernels across runs so torch.compile only pays its cold start once;
+# set before torch is imported so every compile sees it
+os.environ.setdefault('TORCHINDUCTOR_CACHE_DIR', os.path.expanduser('~/.cache/torchinductor_evac'))
+
 import numpy as np
 import torch
 import torch.nn as nn
 import torch.nn.functional as F
 import torch.optim as optim
-import random
-from collections import deque
-import os
 import logging
 
+try:
+    from numba import njit, prange
+    NUMBA_AVAILABLE = True
+except ImportError:  # Numba is optional; without it agents are moved with NumPy broadcasting
+    NUMBA_AVAILABLE = False
+    prange = range
+    def njit(*args, **kwargs):
+        return lambda fn: fn
+
 logger = logging.getLogger(__name__)
 
+@njit(parallel=True, cache=True)
+def _step_agents(agent_xy, active, grid, exits, exit_mask, hazards_xy, hazards_r, dx, dy):
+    """
+    Move every active agent one cell along its combined force, in place.
+    
+    Each agent is pushed by the recommended direction (dx, dy), pulled toward its closest
+    exit and repelled by the hazards in range. Agents only move onto wall-free cells and
+    are marked inactive once they end up within one cell of an exit.
+    
+    Args:
+        agent_xy: Agent (x, y) cells (num_agents, 2), updated in place
+        active: Whether each agent is still inside (num_agents,), updated in place
+        grid: Environment grid (grid_size, grid_size, channels) with walls in channel 1
+        exits: Exit cells (num_exits, 2)
+        exit_mask: Whether a cell is within one cell of an exit (grid_size, grid_size)
+        hazards_xy: Hazard centre cells (num_hazards, 2)
+        hazards_r: Hazard repulsion ranges in cells (num_hazards,)
+        dx, dy: Recommended direction
+    """
+    grid_size = grid.shape[0]
+    for i in prange(agent_xy.shape[0]):
+        if not active[i]:  # Skip evacuated agents
+            continue
+        x = agent_xy[i, 0]
+        y = agent_xy[i, 1]
+        
+        # Compute forces: desired direction + exit attraction + hazard repulsion
+        force_x = float(dx)
+        force_y = float(dy)
+        
+        # Add exit attraction toward the closest exit, found on squared distances
+        min_dist_sq = np.inf
+        closest = -1
+        for j in range(exits.shape[0]):
+            dist_sq = float((x - exits[j, 0])**2 + (y - exits[j, 1])**2)
+            if dist_sq < min_dist_sq:
+                min_dist_sq = dist_sq
+                closest = j
+        if closest >= 0:
+            dist = max(np.sqrt(min_dist_sq), 0.1)  # Avoid division by zero
+            force_x += (exits[closest, 0] - x) / (dist * 5)
+            force_y += (exits[closest, 1] - y) / (dist * 5)
+        
+        # Add hazard repulsion
+        for h in range(hazards_xy.shape[0]):
+            hx = hazards_xy[h, 0]
+            hy = hazards_xy[h, 1]
+            dist_sq = float((x - hx)**2 + (y - hy)**2)
+            if dist_sq < hazards_r[h] * hazards_r[h]:
+                dist = max(np.sqrt(dist_sq), 0.1)  # Avoid division by zero
+                force_x -= (hx - x) / (dist * 3)
+                force_y -= (hy - y) / (dist * 3)
+        
+        # Normalize force vector
+        force_mag = np.sqrt(force_x**2 + force_y**2)
+        if force_mag > 0:
+            force_x /= force_mag
+            force_y /= force_mag
+        
+        # Move agent based on force and check boundaries
+        new_x = min(max(int(np.rint(x + force_x)), 0), grid_size - 1)
+        new_y = min(max(int(np.rint(y + force_y)), 0), grid_size - 1)
+        
+        # Check if new position is valid (no wall)
+        if grid[new_y, new_x, 1] == 0:
+            agent_xy[i, 0] = new_x
+            agent_xy[i, 1] = new_y
+            
+            # Check if reached exit
+            if exit_mask[new_y, new_x]:
+                active[i] = False  # Mark as evacuated
+
 class EvacuationEnvironment:
     """Environment for training RL agents to optimize evacuation plans."""
     
@@ -23,16 +107,34 @@ class EvacuationEnvironment:
         self.walls = self.building_layout.get('walls', [])
         self.exits = self.building_layout.get('exits', [])
         
-        # Create grid representation
-        self.grid = np.zeros((self.grid_size, self.grid_size, 3))  # Channels: agents, walls, hazards
+        # Exit and hazard cells in grid coordinates, converted once rather than every step
+        self.exit_xy = np.array([[int(exit_pos[0] * self.grid_size / 20), int(exit_pos[1] * self.grid_size / 20)]
+                                 for exit_pos in self.exits], dtype=np.int32).reshape(-1, 2)
+        self.hazard_xy = np.array([[int(hazard['position'][0] * self.grid_size / 20), int(hazard['position'][1] * self.grid_size / 20)]
+                                   for hazard in self.hazards], dtype=np.int32).reshape(-1, 2)
+        # Hazard repulsion range in cells: double the radius for safety
+        self.hazard_r = np.array([hazard.get('radius', 2.0) * self.grid_size / 10 for hazard in self.hazards])
+        
+        # Create grid representation in FP32, the precision the policy network consumes
+        self.grid = np.zeros((self.grid_size, self.grid_size, 4), dtype=np.float32)  # Channels: agents, walls, hazards, exits
         self._build_grid()
+        self._state_buf = np.empty_like(self.grid)  # Reused by every _get_state call
+        
+        # Cells agents may spawn on (no wall or hazard), as (y, x) rows; the layout is static
+        self._valid_cells = np.argwhere((self.grid[:, :, 1] == 0) & (self.grid[:, :, 2] < 0.5)).astype(np.int32)
+        self.rng = np.random.default_rng()
         
-        # Agent positions and status
-        self.agent_positions = []
-        self.agent_status = np.zeros(self.num_agents)  # 0 = active, 1 = evacuated
+        # Agent positions and status as arrays: (x, y) cell per agent and whether it is still inside
+        self.agent_xy = np.zeros((self.num_agents, 2), dtype=np.int32)
+        self.agent_active = np.ones(self.num_agents, dtype=bool)  # False once evacuated
         self._previous_evacuated = 0  # Initialize tracking variable
         self.reset()
         
+        # Compile (or load from the Numba cache) the agent update before the first step
+        if NUMBA_AVAILABLE:
+            _step_agents(np.zeros((1, 2), dtype=np.int32), np.zeros(1, dtype=bool), self.grid,
+                         self.exit_xy, self.exit_mask, self.hazard_xy, self.hazard_r, 0, 0)
+        
     def _build_grid(self):
         # Add walls to grid
         for wall in self.walls:
@@ -47,93 +149,97 @@ class EvacuationEnvironment:
             self._draw_line(start_x, start_y, end_x, end_y, channel=1)  # Wall channel
         
         # Add hazards to grid
-        for hazard in self.hazards:
-            pos_x, pos_y = hazard['position']
+        for hazard, (center_x, center_y) in zip(self.hazards, self.hazard_xy):
             radius = hazard.get('radius', 2.0)
             intensity = hazard.get('intensity', 1.0)
             
-            # Convert to grid coordinates
-            center_x = int(pos_x * self.grid_size / 20)
-            center_y = int(pos_y * self.grid_size / 20)
+            # Convert radius to grid cells
             grid_radius = int(radius * self.grid_size / 20)
+            if grid_radius == 0:
+                continue  # Smaller than a cell, covers no cell centre
             
-            # Add circular hazard
-            for y in range(self.grid_size):
-                for x in range(self.grid_size):
-                    dist_sq = (x - center_x)**2 + (y - center_y)**2
-                    if dist_sq < grid_radius**2:
-                        # Hazard intensity decreases with distance
-                        self.grid[y, x, 2] += intensity * (1.0 - np.sqrt(dist_sq) / grid_radius)
+            # Add circular hazard over the whole grid at once (rows along y, columns along x)
+            ys, xs = np.ogrid[:self.grid_size, :self.grid_size]
+            dist_sq = (xs - center_x)**2 + (ys - center_y)**2
+            mask = dist_sq < grid_radius**2
+            # Hazard intensity decreases with distance
+            contribution = intensity * (1.0 - np.sqrt(dist_sq) / grid_radius)
+            self.grid[:, :, 2] += np.where(mask, contribution, 0.0)
+        
+        # Exits never move, so their channel is stamped once here
+        ex, ey = self.exit_xy[:, 0], self.exit_xy[:, 1]
+        inside = (0 <= ex) & (ex < self.grid_size) & (0 <= ey) & (ey < self.grid_size)
+        self.grid[ey[inside], ex[inside], 3] = 1.0
+        
+        # Cells within one cell of an exit (the 3x3 block around it), where agents evacuate;
+        # built from exit_xy so exits just outside the grid still reach its border cells
+        offsets = np.arange(-1, 2)
+        reach_x = np.broadcast_to(ex[:, None, None] + offsets[None, None, :], (len(ex), 3, 3))
+        reach_y = np.broadcast_to(ey[:, None, None] + offsets[None, :, None], (len(ey), 3, 3))
+        inside = (0 <= reach_x) & (reach_x < self.grid_size) & (0 <= reach_y) & (reach_y < self.grid_size)
+        self.exit_mask = np.zeros((self.grid_size, self.grid_size), dtype=bool)
+        self.exit_mask[reach_y[inside], reach_x[inside]] = True
         
     def _draw_line(self, x0, y0, x1, y1, channel):
-        """Draw a line using Bresenham's algorithm."""
+        """
+        Draw a line with the cells Bresenham's algorithm would visit, all in one write.
+        
+        Steps along the major axis and offsets the minor axis by the integer-rounded slope,
+        rounding ties toward the start point exactly as the error-accumulating loop does.
+        """
         dx = abs(x1 - x0)
         dy = abs(y1 - y0)
         sx = 1 if x0 < x1 else -1
         sy = 1 if y0 < y1 else -1
-        err = dx - dy
-        
-        while True:
-            if 0 <= x0 < self.grid_size and 0 <= y0 < self.grid_size:
-                self.grid[y0, x0, channel] = 1.0
-                
-            if x0 == x1 and y0 == y1:
-                break
-                
-            e2 = 2 * err
-            if e2 > -dy:
-                err -= dy
-                x0 += sx
-            if e2 < dx:
-                err += dx
-                y0 += sy
+        steps = np.arange(max(dx, dy) + 1)
+        
+        if dx >= dy:
+            xs = x0 + sx * steps
+            ys = y0 + sy * (np.maximum(2 * steps * dy + dx - 1, 0) // max(2 * dx, 1))
+        else:
+            ys = y0 + sy * steps
+            xs = x0 + sx * ((2 * steps * dx + dy - 1) // (2 * dy))
+        
+        # Only cells inside the grid are drawn
+        inside = (0 <= xs) & (xs < self.grid_size) & (0 <= ys) & (ys < self.grid_size)
+        self.grid[ys[inside], xs[inside], channel] = 1.0
     
     def reset(self):
         """Reset environment to initial state."""
         # Clear agent channel
         self.grid[:, :, 0] = 0
         
-        # Reset agent positions and status
-        self.agent_positions = []
-        self.agent_status = np.zeros(self.num_agents)
+        # Reset agent status
+        self.agent_active = np.ones(self.num_agents, dtype=bool)
         self._previous_evacuated = 0  # Reset tracking variable
         self.time_step = 0
         
-        # Initialize agents at random positions (not on walls or hazards)
-        count = 0
-        while count < self.num_agents:
-            x = np.random.randint(0, self.grid_size)
-            y = np.random.randint(0, self.grid_size)
-            
-            # Check if position is valid (no wall or hazard)
-            if self.grid[y, x, 1] == 0 and self.grid[y, x, 2] < 0.5:
-                self.agent_positions.append((x, y))
-                self.grid[y, x, 0] += 1  # Increment agent count
-                count += 1
+        # Initialize agents at random positions (not on walls or hazards), all drawn at once
+        if len(self._valid_cells) == 0:
+            raise ValueError("No free grid cell to place agents on")
+        idx = self.rng.integers(0, len(self._valid_cells), self.num_agents)
+        ys, xs = self._valid_cells[idx, 0], self._valid_cells[idx, 1]
+        self.agent_xy = np.stack([xs, ys], axis=1)
+        np.add.at(self.grid[:, :, 0], (ys, xs), 1)  # Agent count per cell
         
         # Calculate initial state
         state = self._get_state()
         return state
     
     def _get_state(self):
-        """Get current state representation for RL algorithm."""
-        # Simplified state: normalized grid with agent densities, walls, hazards
-        normalized_grid = self.grid.copy()
+        """
+        Get current state representation for RL algorithm.
+        
+        Returns the environment's own state buffer, which the next step() or reset()
+        overwrites; callers that keep a state across steps must copy it. Only reset()
+        rebuilds it in full, step() refreshes just the cells agents left or entered.
+        """
+        # Simplified state: grid with agent densities, walls, hazards and exit locations
+        np.copyto(self._state_buf, self.grid)
         
         # Normalize agent channel (max density of 5 agents per cell)
-        normalized_grid[:, :, 0] /= 5.0
-        normalized_grid[:, :, 0] = np.clip(normalized_grid[:, :, 0], 0, 1)
-        
-        # State also includes exit locations
-        exit_channel = np.zeros((self.grid_size, self.grid_size))
-        for exit_pos in self.exits:
-            ex, ey = int(exit_pos[0] * self.grid_size / 20), int(exit_pos[1] * self.grid_size / 20)
-            if 0 <= ex < self.grid_size and 0 <= ey < self.grid_size:
-                exit_channel[ey, ex] = 1.0
-        
-        # Add exit channel
-        state = np.dstack((normalized_grid, exit_channel))
-        return state
+        np.clip(self.grid[:, :, 0] / 5.0, 0, 1, out=self._state_buf[:, :, 0])
+        return self._state_buf
         
     def step(self, action):
         """Take action and return new state, reward, done."""
@@ -154,107 +260,40 @@ class EvacuationEnvironment:
         
         dx, dy = directions[action]
         
-        # Clear agent channel
-        self.grid[:, :, 0] = 0
+        # Take the active agents off their current cells (movement only reads the wall channel)
+        old_x = self.agent_xy[self.agent_active, 0]
+        old_y = self.agent_xy[self.agent_active, 1]
+        np.subtract.at(self.grid[:, :, 0], (old_y, old_x), 1)
         
         # Move agents according to the recommended direction
-        for i in range(len(self.agent_positions)):
-            if self.agent_status[i] == 1:  # Skip evacuated agents
-                continue
-                
-            x, y = self.agent_positions[i]
-            
-            # Compute forces: desired direction + exit attraction + hazard repulsion
-            force_x, force_y = dx, dy
-            
-            # Add exit attraction
-            min_dist = float('inf')
-            closest_exit = None
-            for exit_pos in self.exits:
-                ex, ey = int(exit_pos[0] * self.grid_size / 20), int(exit_pos[1] * self.grid_size / 20)
-                dist = np.sqrt((x - ex)**2 + (y - ey)**2)
-                if dist < min_dist:
-                    min_dist = dist
-                    closest_exit = (ex, ey)
-            
-            if closest_exit:
-                ex, ey = closest_exit
-                dist = max(min_dist, 0.1)  # Avoid division by zero
-                force_x += (ex - x) / (dist * 5)
-                force_y += (ey - y) / (dist * 5)
-            
-            # Add hazard repulsion
-            for hazard in self.hazards:
-                pos_x, pos_y = hazard['position']
-                hx, hy = int(pos_x * self.grid_size / 20), int(pos_y * self.grid_size / 20)
-                dist = np.sqrt((x - hx)**2 + (y - hy)**2)
-                if dist < hazard.get('radius', 2.0) * self.grid_size / 10:  # Double radius for safety
-                    dist = max(dist, 0.1)  # Avoid division by zero
-                    force_x -= (hx - x) / (dist * 3)
-                    force_y -= (hy - y) / (dist * 3)
-            
-            # Normalize force vector
-            force_mag = np.sqrt(force_x**2 + force_y**2)
-            if force_mag > 0:
-                force_x /= force_mag
-                force_y /= force_mag
-            
-            # Move agent based on force
-            new_x = int(round(x + force_x))
-            new_y = int(round(y + force_y))
-            
-            # Check boundaries
-            new_x = max(0, min(new_x, self.grid_size - 1))
-            new_y = max(0, min(new_y, self.grid_size - 1))
-            
-            # Check if new position is valid (no wall)
-            if self.grid[new_y, new_x, 1] == 0:
-                # Update position
-                self.agent_positions[i] = (new_x, new_y)
-                
-                # Check if reached exit
-                for exit_pos in self.exits:
-                    ex, ey = int(exit_pos[0] * self.grid_size / 20), int(exit_pos[1] * self.grid_size / 20)
-                    if abs(new_x - ex) <= 1 and abs(new_y - ey) <= 1:
-                        self.agent_status[i] = 1  # Mark as evacuated
-                        break
-        
-        # Update agent grid
-        for i, (x, y) in enumerate(self.agent_positions):
-            if self.agent_status[i] == 0:  # Only active agents
-                self.grid[y, x, 0] += 1
+        if NUMBA_AVAILABLE:
+            _step_agents(self.agent_xy, self.agent_active, self.grid, self.exit_xy, self.exit_mask,
+                         self.hazard_xy, self.hazard_r, dx, dy)
+        else:
+            self._move_agents_numpy(dx, dy)
+        
+        # Put the still active agents on their new cells
+        active_x = self.agent_xy[self.agent_active, 0]
+        active_y = self.agent_xy[self.agent_active, 1]
+        np.add.at(self.grid[:, :, 0], (active_y, active_x), 1)
         
         # Calculate rewards
-        evacuated_now = np.sum(self.agent_status) - self._previous_evacuated
-        self._previous_evacuated = np.sum(self.agent_status)
+        num_evacuated = self.num_agents - np.count_nonzero(self.agent_active)
+        evacuated_now = num_evacuated - self._previous_evacuated
+        self._previous_evacuated = num_evacuated
         
         # Basic reward: number of newly evacuated agents
         reward = evacuated_now * 10.0
         
-        # Penalty for agents in hazardous areas
-        hazard_penalty = 0
-        for i, (x, y) in enumerate(self.agent_positions):
-            if self.agent_status[i] == 0:  # Only active agents
-                hazard_penalty += self.grid[y, x, 2]  # Hazard intensity
+        # Penalty for agents in hazardous areas (hazard intensity under each active agent)
+        hazard_penalty = np.sum(self.grid[active_y, active_x, 2])
         
         reward -= hazard_penalty * 2.0
         
         # Fairness-based reward component
-        if self.exits and np.sum(self.agent_status) > 0:
+        if self.exits and num_evacuated > 0:
             # Count agents evacuated through each exit
-            exit_usage = np.zeros(len(self.exits))
-            for i, (x, y) in enumerate(self.agent_positions):
-                if self.agent_status[i] == 1:  # Evacuated agents
-                    # Find closest exit (assumed to be the one used)
-                    min_dist = float('inf')
-                    used_exit = 0
-                    for j, exit_pos in enumerate(self.exits):
-                        ex, ey = int(exit_pos[0] * self.grid_size / 20), int(exit_pos[1] * self.grid_size / 20)
-                        dist = np.sqrt((x - ex)**2 + (y - ey)**2)
-                        if dist < min_dist:
-                            min_dist = dist
-                            used_exit = j
-                    exit_usage[used_exit] += 1
+            exit_usage = self._compute_exit_usage()
             
             # Calculate Gini coefficient for exit usage
             if np.sum(exit_usage) > 0:
@@ -264,21 +303,81 @@ class EvacuationEnvironment:
                 reward += fairness_reward
         
         # Check if done
-        done = (np.sum(self.agent_status) == self.num_agents) or (self.time_step >= 1000)
+        done = (num_evacuated == self.num_agents) or (self.time_step >= 1000)
         self.time_step += 1
         
-        # Get new state
-        new_state = self._get_state()
+        # Update the state only where the agent count changed; walls, hazards and exits are static
+        dirty_y = np.concatenate([old_y, active_y])
+        dirty_x = np.concatenate([old_x, active_x])
+        self._state_buf[dirty_y, dirty_x, 0] = np.clip(self.grid[dirty_y, dirty_x, 0] / 5.0, 0, 1)
+        new_state = self._state_buf
         
         # Info dict
         info = {
-            'evacuated': int(np.sum(self.agent_status)),
+            'evacuated': int(num_evacuated),
             'hazard_penalty': hazard_penalty,
             'time_step': self.time_step
         }
         
         return new_state, reward, done, info
     
+    def _move_agents_numpy(self, dx, dy):
+        """Vectorized NumPy counterpart of _step_agents, used when Numba is unavailable."""
+        # All active agents are moved at once
+        active = np.flatnonzero(self.agent_active)
+        x = self.agent_xy[active, 0]
+        y = self.agent_xy[active, 1]
+        
+        # Compute forces: desired direction + exit attraction + hazard repulsion
+        force_x = np.full(len(active), float(dx))
+        force_y = np.full(len(active), float(dy))
+        
+        # Add exit attraction toward each agent's closest exit, shape (A, E, 2)
+        if len(self.exit_xy) > 0:
+            diff = self.exit_xy[None, :, :] - self.agent_xy[active, None, :]
+            closest = np.argmin(np.sum(diff**2, axis=2), axis=1)  # Squared distances suffice
+            rows = np.arange(len(active))
+            dist = np.maximum(np.linalg.norm(diff[rows, closest], axis=1), 0.1)  # Avoid division by zero
+            force_x += diff[rows, closest, 0] / (dist * 5)
+            force_y += diff[rows, closest, 1] / (dist * 5)
+        
+        # Add hazard repulsion, one hazard at a time over all agents
+        for (hx, hy), hazard_r in zip(self.hazard_xy, self.hazard_r):
+            dist_sq = (x - hx)**2 + (y - hy)**2
+            in_range = dist_sq < hazard_r**2
+            dist = np.maximum(np.sqrt(dist_sq), 0.1)  # Avoid division by zero
+            force_x -= np.where(in_range, (hx - x) / (dist * 3), 0.0)
+            force_y -= np.where(in_range, (hy - y) / (dist * 3), 0.0)
+        
+        # Normalize force vectors
+        force_mag = np.sqrt(force_x**2 + force_y**2)
+        force_mag[force_mag == 0] = 1.0
+        force_x /= force_mag
+        force_y /= force_mag
+        
+        # Move agents based on force and check boundaries
+        new_x = np.clip(np.round(x + force_x).astype(np.int32), 0, self.grid_size - 1)
+        new_y = np.clip(np.round(y + force_y).astype(np.int32), 0, self.grid_size - 1)
+        
+        # Only agents whose new position is valid (no wall) move
+        valid = self.grid[new_y, new_x, 1] == 0
+        moved = active[valid]
+        new_x, new_y = new_x[valid], new_y[valid]
+        self.agent_xy[moved, 0] = new_x
+        self.agent_xy[moved, 1] = new_y
+        
+        # Agents that moved within one cell of an exit are evacuated
+        reached = self.exit_mask[new_y, new_x]
+        self.agent_active[moved[reached]] = False
+    
+    def _compute_exit_usage(self):
+        """Count the evacuated agents per exit, assuming each used the exit closest to it."""
+        evacuated = self.agent_xy[~self.agent_active]
+        # The closest exit has the smallest squared distance, no square root needed
+        dists_sq = np.sum((evacuated[:, None, :] - self.exit_xy[None, :, :])**2, axis=2)
+        used_exit = np.argmin(dists_sq, axis=1)
+        return np.bincount(used_exit, minlength=len(self.exit_xy))
+    
     def _calculate_gini(self, array):
         """Calculate the Gini coefficient of a numpy array."""
         if np.all(array == 0):
@@ -287,6 +386,38 @@ class EvacuationEnvironment:
         index = np.arange(1, array.shape[0] + 1)
         return np.sum((2 * index - array.shape[0] - 1) * array) / (array.shape[0] * np.sum(array))
 
+class VectorEvacEnv:
+    """Several EvacuationEnvironment copies stepped in lockstep, so one forward pass picks all their actions."""
+    
+    def __init__(self, num_envs, grid_size=50, num_agents=100, building_layout=None, hazards=None):
+        self.envs = [
+            EvacuationEnvironment(grid_size=grid_size, num_agents=num_agents,
+                                  building_layout=building_layout, hazards=hazards)
+            for _ in range(num_envs)
+        ]
+    
+    def reset(self):
+        """Reset every environment and return their states stacked as (num_envs, H, W, C)."""
+        return np.stack([env.reset() for env in self.envs])
+    
+    def step(self, actions):
+        """
+        Take one action in each environment.
+        
+        Finished environments are not reset here, so the caller can read their final agent
+        state and then call reset_env.
+        
+        Returns:
+            Tuple of (states (num_envs, H, W, C), rewards (num_envs,), dones (num_envs,), infos)
+        """
+        results = [env.step(action) for env, action in zip(self.envs, actions)]
+        states, rewards, dones, infos = zip(*results)
+        return np.stack(states), np.array(rewards, dtype=np.float32), np.array(dones), list(infos)
+    
+    def reset_env(self, i):
+        """Reset environment i and return its new state (the environment's own buffer)."""
+        return self.envs[i].reset()
+
 class PolicyNetwork(nn.Module):
     """Neural network for the RL policy."""
     
@@ -325,97 +456,212 @@ class PolicyNetwork(nn.Module):
 class RLAgent:
     """Reinforcement learning agent for evacuation optimization."""
     
-    def __init__(self, state_shape, action_size=8, use_gpu=True):
+    def __init__(self, state_shape, action_size=8, use_gpu=True, use_compile=True, num_envs=1, training=True):
         self.device = torch.device("cuda" if torch.cuda.is_available() and use_gpu else "cpu")
         self.state_shape = state_shape
         self.action_size = action_size
-        
-        # Create policy network
-        self.policy_net = PolicyNetwork(state_shape, action_size).to(self.device)
-        self.target_net = PolicyNetwork(state_shape, action_size).to(self.device)
+        self.num_envs = num_envs  # Batch size of act_batch during training
+        self.training = training  # Whether replay() will run; inference-only agents skip its graphs
+        self.use_compile = use_compile  # Fuse the network layers with torch.compile when available
+        
+        # Create policy network. States arrive as permuted NHWC arrays, which are already
+        # channels_last, so the convolutions use that layout too
+        self.policy_net = PolicyNetwork(state_shape, action_size).to(self.device, memory_format=torch.channels_last)
+        self.target_net = PolicyNetwork(state_shape, action_size).to(self.device, memory_format=torch.channels_last)
         self.target_net.load_state_dict(self.policy_net.state_dict())
         
+        # On GPU the forward and backward passes run under autocast: BF16 where supported,
+        # otherwise FP16 with loss scaling to keep small gradients from underflowing
+        self.use_amp = self.device.type == 'cuda'
+        self.amp_dtype = torch.bfloat16 if self.use_amp and torch.cuda.is_bf16_supported() else torch.float16
+        self.scaler = torch.amp.GradScaler(self.device.type, enabled=self.use_amp and self.amp_dtype == torch.float16)
+        
+        # The target network's forward pass in replay() overlaps the policy network's on a
+        # side stream; the two are independent and each alone is too small to fill the GPU.
+        # Compiled networks replay CUDA graphs from one shared memory pool that assumes the
+        # replays are serialized on a single stream, so they stay on the current stream
+        self.compile_nets = self.use_compile and hasattr(torch, 'compile') and self.device.type == 'cuda'
+        self.target_stream = torch.cuda.Stream() if self.device.type == 'cuda' and not self.compile_nets else None
+        
         self.optimizer = optim.Adam(self.policy_net.parameters(), lr=0.0001)
-        self.memory = deque(maxlen=10000)
+        # Replay memory as preallocated ring buffers, one array per field
+        self.memory_size = 10000
+        self.mem_states = np.empty((self.memory_size, *state_shape), dtype=np.float32)
+        self.mem_next_states = np.empty((self.memory_size, *state_shape), dtype=np.float32)
+        self.mem_actions = np.empty(self.memory_size, dtype=np.int64)
+        self.mem_rewards = np.empty(self.memory_size, dtype=np.float32)
+        self.mem_dones = np.empty(self.memory_size, dtype=np.float32)
+        self.mem_ptr = 0  # Next slot to write, overwriting the oldest experience once full
+        self.mem_size = 0  # Number of stored experiences
         self.batch_size = 32
         self.gamma = 0.99  # Discount factor
         self.epsilon = 1.0  # Exploration rate
         self.epsilon_min = 0.1
         self.epsilon_decay = 0.995
-        self.update_target_frequency = 10  # Update target network every N episodes
-        
+        self.rng = np.random.default_rng()
+        self.tau = 0.005  # Soft update rate of the target network, applied after every replay
+        
+        # Host staging buffers for states headed to the network. On GPU they are pinned so the
+        # copies are asynchronous DMA, and an event marks when the last batch has left them
+        pin = self.device.type == 'cuda'
+        self.h_states = None  # Sized by act_batch for the number of states it gets
+        self.h_batch = torch.empty((self.batch_size, *state_shape), dtype=torch.float32, pin_memory=pin)
+        self.h_next_batch = torch.empty((self.batch_size, *state_shape), dtype=torch.float32, pin_memory=pin)
+        self._staging_free = torch.cuda.Event() if pin else None
+        
+        # On GPU, fuse conv+relu chains and replay them as CUDA graphs; on CPU there are no
+        # launches to save and the compile would cost far more than it gains. Compiling the
+        # modules in place keeps their state_dict keys, so saving and target updates are
+        # unchanged. Shapes are static: one graph per batch size the caller will run
+        if self.compile_nets:
+            self.policy_net.compile(mode='reduce-overhead', fullgraph=True, dynamic=False)
+            self.target_net.compile(mode='reduce-overhead', fullgraph=True, dynamic=False)
+            self._warmup()
+        
+    def _warmup(self):
+        """
+        Compile the network graphs the agent will run up front so the first episode runs at full speed.
+        
+        Training agents need the act_batch forward over num_envs states and the replay batch
+        forward and backward passes; inference-only agents just the single-state forward.
+        """
+        if not self.training:
+            single = torch.zeros((1, *self.state_shape), device=self.device).permute(0, 3, 1, 2)
+            with torch.no_grad(), self.autocast():
+                self.policy_net(single)
+            return
+        
+        envs = torch.zeros((self.num_envs, *self.state_shape), device=self.device).permute(0, 3, 1, 2)
+        batch = torch.zeros((self.batch_size, *self.state_shape), device=self.device).permute(0, 3, 1, 2)
+        with torch.no_grad(), self.autocast():
+            self.policy_net(envs)
+            self.target_net(batch)
+        with self.autocast():
+            self.policy_net(batch).float().sum().backward()
+        self.policy_net.zero_grad(set_to_none=True)
+    
     def remember(self, state, action, reward, next_state, done):
-        """Store experience in replay memory."""
-        self.memory.append((state, action, reward, next_state, done))
+        """Store one experience, or a batch of them with a leading batch axis, in replay memory."""
+        num_experiences = len(state) if np.ndim(state) > len(self.state_shape) else 1
+        slots = (self.mem_ptr + np.arange(num_experiences)) % self.memory_size
+        self.mem_states[slots] = state
+        self.mem_next_states[slots] = next_state
+        self.mem_actions[slots] = action
+        self.mem_rewards[slots] = reward
+        self.mem_dones[slots] = done
+        self.mem_ptr = (self.mem_ptr + num_experiences) % self.memory_size
+        self.mem_size = min(self.mem_size + num_experiences, self.memory_size)
+    
+    def autocast(self):
+        """Mixed-precision context for network forward passes (a no-op on CPU)."""
+        return torch.autocast(device_type=self.device.type, dtype=self.amp_dtype, enabled=self.use_amp)
     
     def act(self, state):
         """Choose action from state using epsilon-greedy policy."""
-        if np.random.rand() <= self.epsilon:
-            return random.randrange(self.action_size)
-        
-        state_tensor = torch.FloatTensor(state).unsqueeze(0).to(self.device)
+        return int(self.act_batch(state[np.newaxis])[0])
+    
+    def act_batch(self, states):
+        """
+        Choose one action per state (num_states, H, W, C) using epsilon-greedy policy.
+        
+        Exploration is drawn per state; all greedy actions come from one forward pass.
+        
+        Returns:
+            Array of actions (num_states,)
+        """
+        num_states = len(states)
+        actions = self.rng.integers(0, self.action_size, num_states)
+        explore = self.rng.random(num_states) < self.epsilon
+        if explore.all():
+            return actions
+        
+        # The previous call ended with a sync, so the staging buffer is free to overwrite
+        if self.h_states is None or len(self.h_states) != num_states:
+            self.h_states = torch.empty((num_states, *self.state_shape), dtype=torch.float32,
+                                        pin_memory=self.device.type == 'cuda')
+        self.h_states.copy_(torch.from_numpy(states))
+        state_tensor = self.h_states.to(self.device, non_blocking=True)
         state_tensor = state_tensor.permute(0, 3, 1, 2)  # [batch, channels, height, width]
-        self.policy_net.eval()
-        with torch.no_grad():
+        # The network has no dropout or batch norm, so no eval()/train() switch is needed
+        with torch.no_grad(), self.autocast():
             action_values = self.policy_net(state_tensor)
-        self.policy_net.train()
-        return torch.argmax(action_values).item()
+        # The environments need the actions on the host
+        greedy = torch.argmax(action_values, dim=1).cpu().numpy()
+        return np.where(explore, actions, greedy)
     
     def replay(self):
-        """Train on batch of experiences from replay memory."""
-        if len(self.memory) < self.batch_size:
-            return 0
-            
-        # Sample batch from memory
-        minibatch = random.sample(self.memory, self.batch_size)
-        
-        states = []
-        targets = []
-        
-        for state, action, reward, next_state, done in minibatch:
-            # Convert to tensors
-            state_tensor = torch.FloatTensor(state).to(self.device)
-            state_tensor = state_tensor.permute(2, 0, 1)  # [channels, height, width]
-            next_state_tensor = torch.FloatTensor(next_state).to(self.device)
-            next_state_tensor = next_state_tensor.permute(2, 0, 1)  # [channels, height, width]
+        """
+        Train on batch of experiences from replay memory.
+        
+        Returns:
+            The detached loss tensor, left on the device so training does not wait for the
+            GPU every step, or None while memory holds less than one batch
+        """
+        if self.mem_size < self.batch_size:
+            return None
             
-            # Calculate target
-            target = reward
-            if not done:
-                with torch.no_grad():
-                    target += self.gamma * torch.max(
-                        self.target_net(next_state_tensor.unsqueeze(0))
-                    ).item()
-            
-            # Update target for action taken
-            target_f = self.policy_net(state_tensor.unsqueeze(0))
-            target_f = target_f.detach().cpu().numpy()[0]
-            target_f[action] = target
-            
-            # Append to training batch
-            states.append(state_tensor.unsqueeze(0))
-            targets.append(torch.FloatTensor(target_f).unsqueeze(0))
-        
-        # Convert lists to tensors
-        states = torch.cat(states, dim=0)
-        targets = torch.cat(targets, dim=0).to(self.device)
+        # Sample batch from memory, gathering the states straight into the staging buffers once
+        # the previous batch has been copied out of them
+        idx = self.rng.integers(0, self.mem_size, self.batch_size)
+        if self._staging_free is not None:
+            self._staging_free.synchronize()
+        np.take(self.mem_states, idx, axis=0, out=self.h_batch.numpy())
+        np.take(self.mem_next_states, idx, axis=0, out=self.h_next_batch.numpy())
+        
+        # Move each field to the device in one transfer
+        states = self.h_batch.to(self.device, non_blocking=True)
+        states = states.permute(0, 3, 1, 2)  # [batch, channels, height, width]
+        next_states = self.h_next_batch.to(self.device, non_blocking=True)
+        next_states = next_states.permute(0, 3, 1, 2)  # [batch, channels, height, width]
+        if self._staging_free is not None:
+            self._staging_free.record()
+        actions = torch.from_numpy(self.mem_actions[idx]).to(self.device, non_blocking=True)
+        rewards = torch.from_numpy(self.mem_rewards[idx]).to(self.device, non_blocking=True)
+        dones = torch.from_numpy(self.mem_dones[idx]).to(self.device, non_blocking=True)
+        
+        # Calculate targets with one batched forward pass through the target network, queued
+        # on the side stream (a no-op context on CPU or for compiled networks) while the policy network runs
+        if self.target_stream is not None:
+            self.target_stream.wait_stream(torch.cuda.current_stream())
+            next_states.record_stream(self.target_stream)  # Keep the allocator from reusing it early
+        with torch.cuda.stream(self.target_stream), torch.no_grad(), self.autocast():
+            q_next = self.target_net(next_states).max(dim=1).values.float()
         
         # Train the network
         self.optimizer.zero_grad()
-        outputs = self.policy_net(states)
+        with self.autocast():
+            outputs = self.policy_net(states).float()
+        
+        if self.target_stream is not None:
+            torch.cuda.current_stream().wait_stream(self.target_stream)
+            q_next.record_stream(torch.cuda.current_stream())
+        action_targets = rewards + self.gamma * q_next * (1 - dones)
+        
+        # Update target for action taken; the other actions are their own targets
+        targets = outputs.detach().clone()
+        targets[torch.arange(self.batch_size, device=self.device), actions] = action_targets
         loss = F.mse_loss(outputs, targets)
-        loss.backward()
-        self.optimizer.step()
+        self.scaler.scale(loss).backward()
+        self.scaler.step(self.optimizer)
+        self.scaler.update()
+        self.update_target_network()
         
         # Decay epsilon
         if self.epsilon > self.epsilon_min:
             self.epsilon *= self.epsilon_decay
             
-        return loss.item()
+        return loss.detach()
     
+    @torch.no_grad()
     def update_target_network(self):
-        """Update target network weights with policy network weights."""
-        self.target_net.load_state_dict(self.policy_net.state_dict())
+        """
+        Move the target network weights toward the policy network weights (Polyak averaging).
+        
+        Updates the parameters in place, target <- (1 - tau) * target + tau * policy, without
+        building a state_dict.
+        """
+        for target_param, param in zip(self.target_net.parameters(), self.policy_net.parameters()):
+            target_param.lerp_(param, self.tau)
     
     def save(self, path):
         """Save policy network weights."""
@@ -430,13 +676,20 @@ class RLAgent:
 class EvacuationRL:
     """Main class for training and evaluating RL-based evacuation strategies."""
     
-    def __init__(self, grid_size=50, num_agents=100, use_gpu=True):
+    def __init__(self, grid_size=50, num_agents=100, use_gpu=True, num_envs=16):
         self.grid_size = grid_size
         self.num_agents = num_agents
         self.use_gpu = use_gpu
+        self.num_envs = num_envs  # Environments stepped together during training
         
     def train(self, building_layout=None, hazards=None, episodes=1000, render=False, use_mock=False):
-        """Train an RL agent for evacuation optimization."""
+        """
+        Train an RL agent for evacuation optimization.
+        
+        Episodes run num_envs at a time in a VectorEvacEnv; every vector step stores one
+        transition per environment and runs as many replays, the same one replay per
+        transition as training on a single environment.
+        """
         # If mock mode is enabled, return fake training results immediately
         if use_mock or os.environ.get('DEV_MODE') == 'mock':
             logger.info(f"Generating mock training results with: grid_size={self.grid_size}, num_agents={self.num_agents}, episodes={episodes}")
@@ -445,24 +698,21 @@ class EvacuationRL:
             base_reward = self.grid_size / 10.0  # Base reward scales with grid size
             agent_factor = self.num_agents / 100.0  # Agent factor scales with number of agents
             
-            # Create patterns that vary based on parameters
-            rewards_history = []
-            evacuation_times = []
-            gini_history = []
+            # Create patterns that vary based on parameters, all episodes at once; each series
+            # gets its own ±10% jitter
+            rng = np.random.default_rng()
+            progress_factor = np.arange(episodes) / episodes
+            reward_jitter, time_jitter, gini_jitter, loss_jitter = 0.9 + 0.2 * rng.random((4, episodes))
             
-            for i in range(episodes):
-                # Reward increases over time, scaled by parameters
-                progress_factor = i / episodes
-                reward = base_reward * (1 + progress_factor * 2) * agent_factor * (0.9 + 0.2 * random.random())
-                rewards_history.append(float(reward))
-                
-                # Evacuation time decreases over time, scaled by parameters
-                evac_time = (100 - (70 * progress_factor)) * (self.num_agents / 50.0) * (0.9 + 0.2 * random.random())
-                evacuation_times.append(int(max(10, evac_time)))
-                
-                # Gini coefficient decreases over time (fairness improves)
-                gini = max(0.05, 0.5 - (0.4 * progress_factor) * (0.9 + 0.2 * random.random()))
-                gini_history.append(float(gini))
+            # Reward increases over time, scaled by parameters
+            rewards_history = (base_reward * (1 + progress_factor * 2) * agent_factor * reward_jitter).tolist()
+            
+            # Evacuation time decreases over time, scaled by parameters
+            evac_time = (100 - (70 * progress_factor)) * (self.num_agents / 50.0) * time_jitter
+            evacuation_times = np.maximum(10, evac_time).astype(int).tolist()
+            
+            # Gini coefficient decreases over time (fairness improves)
+            gini_history = np.maximum(0.05, 0.5 - (0.4 * progress_factor) * gini_jitter).tolist()
             
             logger.info(f"Generated mock data with final reward: {rewards_history[-1]:.2f}, " 
                        f"final evacuation time: {evacuation_times[-1]}, final gini: {gini_history[-1]:.2f}")
@@ -471,12 +721,17 @@ class EvacuationRL:
                 'rewards': rewards_history,
                 'evacuation_times': evacuation_times,
                 'gini_history': gini_history,
-                'losses': [0.1 * (0.99 ** i) * (0.9 + 0.2 * random.random()) for i in range(episodes)],
+                'losses': (0.1 * (0.99 ** np.arange(episodes)) * loss_jitter).tolist(),
                 'mock_data': True
             }
         
-        # Create environment
-        env = EvacuationEnvironment(
+        # Nothing to train; VectorEvacEnv needs at least one environment
+        if episodes <= 0:
+            return {'rewards': [], 'evacuation_times': [], 'gini_history': [], 'losses': []}
+        
+        # Create environments; no more than there are episodes to run
+        vec_env = VectorEvacEnv(
+            min(self.num_envs, episodes),
             grid_size=self.grid_size,
             num_agents=self.num_agents,
             building_layout=building_layout,
@@ -484,8 +739,8 @@ class EvacuationRL:
         )
         
         # Initialize agent
-        state_shape = env.reset().shape
-        agent = RLAgent(state_shape, action_size=8, use_gpu=self.use_gpu)
+        states = vec_env.reset()
+        agent = RLAgent(states.shape[1:], action_size=8, use_gpu=self.use_gpu, num_envs=len(vec_env.envs))
         
         # Training metrics
         rewards_history = []
@@ -493,76 +748,76 @@ class EvacuationRL:
         gini_history = []
         losses = []
         
-        # Training loop
-        for episode in range(episodes):
-            # Reset environment
-            state = env.reset()
-            done = False
-            total_reward = 0
-            step = 0
+        # Running totals of the episode in progress in each environment
+        total_rewards = np.zeros(len(vec_env.envs))
+        steps = np.zeros(len(vec_env.envs), dtype=int)
+        
+        # Training loop: every environment steps at once and restarts as soon as it finishes,
+        # until the requested number of episodes has completed
+        episode = 0
+        while episode < episodes:
+            # Choose and take actions
+            actions = agent.act_batch(states)
+            next_states, rewards, dones, infos = vec_env.step(actions)
             
-            while not done:
-                # Choose and take action
-                action = agent.act(state)
-                next_state, reward, done, info = env.step(action)
-                
-                # Remember experience
-                agent.remember(state, action, reward, next_state, done)
-                
-                # Move to next state
-                state = next_state
-                total_reward += reward
-                step += 1
-                
-                # Train on batch of experiences
+            # Remember experiences
+            agent.remember(states, actions, rewards, next_states, dones)
+            total_rewards += rewards
+            steps += 1
+            
+            # Train on batches of experiences, one replay per stored transition as with a
+            # single environment, so updates and epsilon decay keep their per-transition pace
+            for _ in range(len(vec_env.envs)):
                 loss = agent.replay()
-                if loss > 0:
+                if loss is not None:
                     losses.append(loss)
             
-            # Update target network periodically
-            if episode % agent.update_target_frequency == 0:
-                agent.update_target_network()
-            
-            # Record metrics
-            rewards_history.append(total_reward)
-            evacuation_times.append(step)
-            
-            # Calculate Gini coefficient
-            if env.exits and info['evacuated'] > 0:
-                # Count evacuated agents per exit
-                exit_usage = np.zeros(len(env.exits))
-                for i, (x, y) in enumerate(env.agent_positions):
-                    if env.agent_status[i] == 1:  # Evacuated
-                        min_dist = float('inf')
-                        used_exit = 0
-                        for j, exit_pos in enumerate(env.exits):
-                            ex, ey = int(exit_pos[0] * env.grid_size / 20), int(exit_pos[1] * env.grid_size / 20)
-                            dist = np.sqrt((x - ex)**2 + (y - ey)**2)
-                            if dist < min_dist:
-                                min_dist = dist
-                                used_exit = j
-                        exit_usage[used_exit] += 1
+            for i in np.flatnonzero(dones):
+                if episode == episodes:
+                    break
+                env, info = vec_env.envs[i], infos[i]
+                episode += 1
                 
-                if np.sum(exit_usage) > 0:
-                    exit_usage = exit_usage / np.sum(exit_usage)
-                    gini = env._calculate_gini(exit_usage)
-                    gini_history.append(gini)
+                # Record metrics
+                rewards_history.append(float(total_rewards[i]))
+                evacuation_times.append(int(steps[i]))
+                
+                # Calculate Gini coefficient
+                if env.exits and info['evacuated'] > 0:
+                    # Count evacuated agents per exit
+                    exit_usage = env._compute_exit_usage()
+                    
+                    if np.sum(exit_usage) > 0:
+                        exit_usage = exit_usage / np.sum(exit_usage)
+                        gini = env._calculate_gini(exit_usage)
+                        gini_history.append(gini)
+                
+                # Print progress
+                if episode % 10 == 0:
+                    print(f"Episode {episode}/{episodes}")
+                    print(f"  Reward: {total_rewards[i]:.2f}")
+                    print(f"  Evacuation Time: {steps[i]}")
+                    print(f"  Evacuated: {info['evacuated']}/{env.num_agents}")
+                    if len(gini_history) > 0:
+                        print(f"  Exit Gini Coefficient: {gini_history[-1]:.4f}")
+                    if len(losses) > 0:
+                        print(f"  Average Loss: {torch.stack(losses[-100:]).mean().item():.6f}")
+                    print(f"  Epsilon: {agent.epsilon:.4f}")
+                
+                # Start the environment's next episode
+                next_states[i] = vec_env.reset_env(i)
+                total_rewards[i] = 0
+                steps[i] = 0
             
-            # Print progress
-            if (episode + 1) % 10 == 0:
-                print(f"Episode {episode + 1}/{episodes}")
-                print(f"  Reward: {total_reward:.2f}")
-                print(f"  Evacuation Time: {step}")
-                print(f"  Evacuated: {info['evacuated']}/{env.num_agents}")
-                if len(gini_history) > 0:
-                    print(f"  Exit Gini Coefficient: {gini_history[-1]:.4f}")
-                if len(losses) > 0:
-                    print(f"  Average Loss: {np.mean(losses[-100:]):.6f}")
-                print(f"  Epsilon: {agent.epsilon:.4f}")
+            # Move to next states
+            states = next_states
         
         # Save final model
         agent.save("models/evacuation_rl_model.pt")
         
+        # Losses stayed on the device during training; fetch them in one transfer
+        losses = torch.stack(losses).tolist() if losses else []
+        
         # Return training metrics
         return {
             'rewards': rewards_history,
@@ -583,7 +838,7 @@ class EvacuationRL:
         
         # Initialize agent
         state_shape = env.reset().shape
-        agent = RLAgent(state_shape, action_size=8, use_gpu=self.use_gpu)
+        agent = RLAgent(state_shape, action_size=8, use_gpu=self.use_gpu, training=False)
         
         # Load trained weights
         agent.load(model_path)
@@ -600,12 +855,8 @@ class EvacuationRL:
             step = 0
             
             while not done:
-                # Choose action (no exploration)
-                state_tensor = torch.FloatTensor(state).unsqueeze(0).to(agent.device)
-                state_tensor = state_tensor.permute(0, 3, 1, 2)  # [batch, channels, height, width]
-                with torch.no_grad():
-                    action_values = agent.policy_net(state_tensor)
-                action = torch.argmax(action_values).item()
+                # Choose action (no exploration: epsilon is 0, so act() is greedy)
+                action = agent.act(state)
                 
                 # Take action
                 next_state, _, done, info = env.step(action)
@@ -618,18 +869,7 @@ class EvacuationRL:
             
             # Calculate final Gini coefficient for exit usage
             if env.exits and info['evacuated'] > 0:
-                exit_usage = np.zeros(len(env.exits))
-                for i, (x, y) in enumerate(env.agent_positions):
-                    if env.agent_status[i] == 1:  # Evacuated
-                        min_dist = float('inf')
-                        used_exit = 0
-                        for j, exit_pos in enumerate(env.exits):
-                            ex, ey = int(exit_pos[0] * env.grid_size / 20), int(exit_pos[1] * env.grid_size / 20)
-                            dist = np.sqrt((x - ex)**2 + (y - ey)**2)
-                            if dist < min_dist:
-                                min_dist = dist
-                                used_exit = j
-                        exit_usage[used_exit] += 1
+                exit_usage = env._compute_exit_usage()
                 
                 if np.sum(exit_usage) > 0:
                     exit_usage = exit_usage / np.sum(exit_usage)